@@ -0,0 +1,433 @@
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib import pyplot as plt
+
+import profiling
+from constants import *
+from main import ChatData
+from message import Chat
+from visualisation import *
+
+_start_date = datetime.datetime(2015, 1, 1, 8, 0)
+_words = ("hey hi hello yes no maybe okay sure thanks tonight tomorrow today weekend dinner lunch coffee movie game "
+          "work school train late early home where when what why how good great nice funny love miss see you me we "
+          "the a an and or but with from about over under again after before CAPS Straße café élan naïve 😂 👍 ❤️ "
+          "13:37 2x www.example.com haha lol").split()
+# Word pairs to search for at once, as many as it takes before search_list switches to its automaton
+_search_patterns = list(f"{first} {second}" for first in _words for second in _words)[::7][:min_automaton_patterns]
+# Cases that should never be slower than the case they replace
+_baselines = {"ChatData.search_list 16": "ChatData.search 16",
+              "ChatData.search_list automaton": "ChatData.search automaton"}
+_gaps = (0, 0, 0, 1, 1, 2, 3, 5, 8, 15, 25, 45, 90, 240, 600, 1200)  # minutes between two messages
+# Code run in a fresh interpreter per startup path, with the time it may take in seconds
+_startup_budgets = {"parse": ("from message import Chat", 0.5),
+                    "menu": ("import menu", 0.3),
+                    "analysis": ("import main", 1.5)}
+
+
+def get_header(date_time, date_format):
+    """
+    :type date_time: datetime.datetime
+    :param date_format: date format from Format.all_dates
+    :type date_format: str
+    :return: start of a message line up to the author, like WhatsApp exports it in the date format
+    :rtype: str
+    """
+    match date_format:
+        case Format.date_1:
+            return f"{date_time:%d-%m-%Y %H:%M} - "
+        case Format.date_2:
+            return f"{date_time.month}/{date_time.day}/{date_time:%y}, {date_time:%H:%M} - "
+        case Format.date_3:
+            return f"{date_time:%d-%m-%y, %H:%M} - "
+    raise ValueError(f"Unknown date format {date_format}")
+
+
+def get_authors(amount):
+    """
+    :type amount: int
+    :return: names of authors, every third author is only known by a phone number
+    :rtype: list of str
+    """
+    return list(f"+31 6 {10000000 + i * 7919}" if i % 3 == 2 else f"Author {i + 1}" for i in range(amount))
+
+
+def generate_chat(path, messages, date_format, authors=4, multiline=0.05, media=0.05, announcements=0.01, seed=0):
+    """Write a synthetic WhatsApp export, the same arguments always create the same file
+
+    :param path: file to write
+    :type path: str
+    :param messages: amount of messages, announcements included
+    :type messages: int
+    :param date_format: date format from Format.all_dates
+    :type date_format: str
+    :param authors: amount of authors
+    :type authors: int
+    :param multiline: fraction of messages spanning multiple lines
+    :type multiline: float
+    :param media: fraction of messages that are media placeholders
+    :type media: float
+    :param announcements: fraction of messages that are WhatsApp announcements
+    :type announcements: float
+    :type seed: int
+    """
+    generator = random.Random(seed)
+    names = get_authors(authors)
+    date_time = _start_date
+    headers = dict()
+    lines = list()
+    with open(path, "w", encoding="utf-8") as file:
+        for i in range(messages):
+            date_time += datetime.timedelta(minutes=generator.choice(_gaps))
+            if date_time not in headers:
+                headers.clear()
+                headers[date_time] = get_header(date_time, date_format)
+            header = headers[date_time]
+
+            kind = generator.random()
+            if kind < announcements:
+                lines.append(f"{header}{generator.choice(names)} added {generator.choice(names)}")
+            elif kind < announcements + media:
+                lines.append(f"{header}{generator.choice(names)}: {Filter.sentences[0]}")
+            else:
+                text = " ".join(generator.choices(_words, k=generator.randint(1, 15)))
+                if kind < announcements + media + multiline:
+                    text += "\n" + " ".join(generator.choices(_words, k=generator.randint(1, 8))) + "\n\nPS: " + \
+                            " ".join(generator.choices(_words, k=3))
+                lines.append(f"{header}{generator.choice(names)}: {text}")
+
+            if len(lines) >= 10000:
+                file.write("\n".join(lines) + "\n")
+                lines.clear()
+        if lines:
+            file.write("\n".join(lines) + "\n")
+
+
+def get_chat_filename(messages, date_format, authors, seed=0):
+    """Generate the chat once and return its filename relative to the chats folder
+
+    :type messages: int
+    :type date_format: str
+    :type authors: int
+    :type seed: int
+    :rtype: str
+    """
+    folder = f"{Directory.folder_chats}/{Directory.folder_benchmark_chats}"
+    os.makedirs(folder, exist_ok=True)
+    filename = f"{Directory.folder_benchmark_chats}/chat_{messages}_{Format.all_dates.index(date_format) + 1}_" \
+               f"{authors}_{seed}.txt"
+    if not os.path.exists(f"{Directory.folder_chats}/{filename}"):
+        generate_chat(f"{Directory.folder_chats}/{filename}", messages, date_format, authors, seed=seed)
+    return filename
+
+
+def measure(function, repeat=1, memory=True):
+    """
+    :param function: function without arguments to measure
+    :type function: function
+    :param repeat: amount of timed runs, the fastest counts
+    :type repeat: int
+    :param memory: run the function once more while tracing the peak of the allocated memory
+    :type memory: bool
+    :return: result of the last run, fastest time in seconds and peak memory in bytes or None
+    :rtype: (Any, float, int or None)
+    """
+    seconds = None
+    result = None
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+    peak = None
+    if memory:
+        result = None
+        gc.collect()
+        tracemalloc.start()
+        try:
+            result = function()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, seconds, peak
+
+
+def get_cases(chat, filename, columnar):
+    """
+    :param chat: parsed chat to analyse
+    :type chat: Chat
+    :param filename: file the chat was parsed from
+    :type filename: str
+    :param columnar: parse the chat as MessageColumns in the from_file case
+    :type columnar: bool
+    :return: name, function without arguments and amount of items it processes of every benchmark
+    :rtype: list of (str, function, int)
+    """
+    messages = len(chat)
+    middle = chat.start_date + (chat.end_date - chat.start_date) / 2
+    date_filter = (datetime.datetime.combine(chat.start_date, datetime.time()),
+                   datetime.datetime.combine(middle, datetime.time()))
+    time_filter = (datetime.time(9), datetime.time(17))
+    words = ChatData.filter_unique_words(ChatData.unique_words(chat))
+    data_minute = ChatData.from_command_chat(chat, Result.minute)
+    data_date = ChatData.from_command_chat(chat, Result.date)
+    data_days = ChatData.from_command_chats([chat, Chat.from_filter(chat, date_filter=date_filter)], Result.day)
+
+    cases = [("Chat.from_file", lambda: Chat.from_file(filename, columnar=columnar), messages),
+             ("Chat.from_filter date", lambda: Chat.from_filter(chat, date_filter=date_filter), messages),
+             ("Chat.from_filter author", lambda: Chat.from_filter(chat, author_filter=chat.authors[0]), messages),
+             ("Chat.from_filter time", lambda: Chat.from_filter(chat, time_filter=time_filter), messages),
+             ("Chat.from_filter length", lambda: Chat.from_filter(chat, length_filter=(10, 80)), messages)]
+    for data_type in sorted(set(Result.all), key=Result.all.index):
+        cases.append((f"ChatData.from_command_chat {data_type}",
+                      lambda data_type=data_type: ChatData.from_command_chat(chat, data_type), messages))
+    cases += [("ChatData.from_command_chats", lambda: ChatData.from_command_chats([chat, chat], Result.hour),
+               2 * messages),
+              ("ChatData.aggregate", lambda: ChatData.aggregate(chat), messages),
+              ("ChatData.message_lengths", lambda: ChatData.message_lengths(chat), messages),
+              ("ChatData.chat_starters", lambda: ChatData.chat_starters(chat), messages),
+              ("ChatData.chat_enders", lambda: ChatData.chat_enders(chat), messages),
+              ("ChatData.conversations", lambda: ChatData.conversations(chat), messages),
+              ("ChatData.response_times", lambda: ChatData.response_times(chat), messages),
+              ("ChatData.letters", lambda: ChatData.letters(chat), messages),
+              ("ChatData.count_media", lambda: ChatData.count_media(chat), messages),
+              ("ChatData.unique_words", lambda: ChatData.unique_words(chat), messages),
+              ("ChatData.filter_unique_words", lambda: ChatData.filter_unique_words(ChatData.unique_words(chat)),
+               messages),
+              ("ChatData.search", lambda: ChatData.search(chat, "hello"), messages),
+              ("ChatData.search_list", lambda: ChatData.search_list(chat, ["hello", "love", "coffee", "haha"]),
+               messages),
+              ("ChatData.search 16", lambda: list(ChatData.search(chat, word) for word in _words[:16]), messages),
+              ("ChatData.search_list 16", lambda: ChatData.search_list(chat, _words[:16]), messages),
+              ("ChatData.search automaton",
+               lambda: list(ChatData.search(chat, pattern) for pattern in _search_patterns), messages),
+              ("ChatData.search_list automaton", lambda: ChatData.search_list(chat, _search_patterns), messages),
+              ("ChatData.word_timeline", lambda: ChatData.word_timeline(chat, "hello"), messages),
+              ("ChatData.build_word_index", lambda: ChatData.build_word_index(chat), messages),
+              ("get_figure_1", lambda: _close(get_figure_1(data_minute)), len(data_minute)),
+              ("get_figure_date", lambda: _close(get_figure_date(data_date)), len(data_date)),
+              ("get_figure_days", lambda: _close(get_figure_days(data_days)), len(data_days)),
+              ("word_cloud", lambda: word_cloud(words), len(words))]
+    return cases
+
+
+def _close(figure_axes):
+    plt.close(figure_axes[0])
+    return figure_axes
+
+
+def run_benchmark(messages, date_format, authors=4, columnar=True, repeat=1, memory=True, seed=0):
+    """Time every case on a generated chat
+
+    :type messages: int
+    :type date_format: str
+    :type authors: int
+    :param columnar: store the chat as MessageColumns
+    :type columnar: bool
+    :param repeat: amount of timed runs per case, the fastest counts
+    :type repeat: int
+    :param memory: also measure the peak memory of every case
+    :type memory: bool
+    :type seed: int
+    :return: result of every case
+    :rtype: list of dict
+    """
+    filename = get_chat_filename(messages, date_format, authors, seed)
+    size = os.path.getsize(f"{Directory.folder_chats}/{filename}")
+    chat = Chat.from_file(filename, columnar=columnar)
+
+    results = list()
+    for name, function, items in get_cases(chat, filename, columnar):
+        seconds, peak = measure(function, repeat, memory)[1:]
+        result = dict(name=name, messages=messages, date_format=date_format, authors=authors, columnar=columnar,
+                      items=items, seconds=seconds, items_per_second=items / seconds if seconds else None,
+                      peak_memory=peak)
+        if name == "Chat.from_file":
+            result["megabytes_per_second"] = size / 1024 ** 2 / seconds if seconds else None
+        results.append(result)
+        print(format_result(result))
+
+    seconds = {result["name"]: result["seconds"] for result in results}
+    for result in results:
+        baseline = _baselines.get(result["name"])
+        if baseline is not None:
+            result["budget"] = seconds[baseline]
+            result["within_budget"] = result["seconds"] <= result["budget"]
+            if not result["within_budget"]:
+                print(f"{result['name']} is slower than {baseline}")
+    return results
+
+
+def measure_startup(code, repeat=3):
+    """
+    :param code: Python code to run in a fresh interpreter from the current working directory
+    :type code: str
+    :param repeat: amount of runs, the fastest counts
+    :type repeat: int
+    :return: seconds from starting the interpreter until it exits
+    :rtype: float
+    """
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                              environment.get("PYTHONPATH")]))
+    seconds = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], env=environment, check=True)
+        elapsed = time.perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+    return seconds
+
+
+def run_startup_benchmark(repeat=3):
+    """Time the cold start of every startup path and check it against its budget
+
+    :param repeat: amount of runs per path, the fastest counts
+    :type repeat: int
+    :return: result of every startup path
+    :rtype: list of dict
+    """
+    results = list()
+    for name, (code, budget) in _startup_budgets.items():
+        seconds = measure_startup(code, repeat)
+        result = dict(name=f"startup {name}", messages=0, date_format=None, authors=0, columnar=None, items=0,
+                      seconds=seconds, items_per_second=None, peak_memory=None, budget=budget,
+                      within_budget=seconds <= budget)
+        results.append(result)
+        print(format_result(result) + ("" if result["within_budget"] else f" OVER BUDGET OF {budget} s"))
+    return results
+
+
+def format_result(result):
+    """
+    :type result: dict
+    :return: one line summary of a result
+    :rtype: str
+    """
+    memory = "" if result["peak_memory"] is None else f" {result['peak_memory'] / 1024 ** 2:10.1f} MiB"
+    throughput = "" if result["items_per_second"] is None else f" {result['items_per_second']:14,.0f} items/s"
+    return f"{result['name']:<40} {result['messages']:>10,} {result['seconds']:10.4f} s{throughput}{memory}"
+
+
+def get_key(result):
+    return result["name"], result["messages"], result["date_format"], result["authors"], result["columnar"]
+
+
+def get_revision():
+    """
+    :return: git commit of the working directory, if any
+    :rtype: str or None
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(results, folder=Directory.folder_benchmarks):
+    """
+    :type results: list of dict
+    :param folder: folder to store the results in, one JSON file per run
+    :type folder: str
+    :return: path of the created file
+    :rtype: str
+    """
+    os.makedirs(folder, exist_ok=True)
+    created = datetime.datetime.now()
+    path = f"{folder}/benchmark_{created:%Y%m%d_%H%M%S}.json"
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(dict(created=created.isoformat(timespec="seconds"),
+                       revision=get_revision(),
+                       python=sys.version,
+                       platform=platform.platform(),
+                       results=results), file, indent=1)
+    return path
+
+
+def load_results(path):
+    """
+    :param path: file created by save_results
+    :type path: str
+    :rtype: list of dict
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)["results"]
+
+
+def compare_results(old, new, threshold=1.1):
+    """Print the ratio between the time of every case in both runs
+
+    :param old: results of the previous version
+    :type old: list of dict
+    :param new: results of the current version
+    :type new: list of dict
+    :param threshold: ratio from which a case is reported as a regression
+    :type threshold: float
+    :return: cases that became slower by at least the threshold
+    :rtype: list of dict
+    """
+    previous = {get_key(result): result for result in old}
+    regressions = list()
+    for result in new:
+        other = previous.get(get_key(result))
+        if other is None or not other["seconds"]:
+            continue
+        ratio = result["seconds"] / other["seconds"]
+        marker = ""
+        if ratio >= threshold:
+            regressions.append(result)
+            marker = " REGRESSION"
+        print(f"{result['name']:<40} {result['messages']:>10,} {other['seconds']:10.4f} s -> "
+              f"{result['seconds']:10.4f} s {ratio:6.2f}x{marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parsing, analysing and plotting synthetic chats")
+    parser.add_argument("--messages", type=int, nargs="+", default=[10000, 100000],
+                        help="chat sizes, from 10000 up to 10000000 messages")
+    parser.add_argument("--formats", nargs="+", default=Format.all_dates, choices=Format.all_dates)
+    parser.add_argument("--authors", type=int, default=4)
+    parser.add_argument("--list", action="store_true", help="store chats as a list of Message instead of columns")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--no-memory", action="store_true", help="skip measuring the peak memory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", help="results file of an earlier run to compare with")
+    parser.add_argument("--profile", action="store_true", help="also record the time spent in every stage")
+    arguments = parser.parse_args()
+
+    if arguments.profile:
+        profiling.enable()
+
+    results = run_startup_benchmark(arguments.repeat)
+    for messages in arguments.messages:
+        for date_format in arguments.formats:
+            results += run_benchmark(messages, date_format, arguments.authors, not arguments.list, arguments.repeat,
+                                     not arguments.no_memory, arguments.seed)
+    path = save_results(results)
+    print(f"Results saved in {path}")
+    if arguments.profile:
+        print(profiling.get_summary())
+        profiling.save(path.replace("benchmark_", "profile_"))
+    if arguments.compare is not None:
+        compare_results(load_results(arguments.compare), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,334 @@
+import collections as _collections
+import datetime as _datetime
+import functools as _functools
+import hashlib as _hashlib
+import json as _json
+import os as _os
+import sys as _sys
+import time as _time
+
+import numpy as _np
+
+from constants import Directory, cache_max_size, result_cache_max_items, result_cache_max_memory
+
+_version = 1
+_index_filename = "index.json"
+_result_cache = None
+
+
+def get_file_hash(path, block_size=1024 ** 2):
+    """
+    :type path: str
+    :type block_size: int
+    :return: hash of the file content
+    :rtype: str
+    """
+    file_hash = _hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        while block := file.read(block_size):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+class ChatCache:
+    def __init__(self, folder=Directory.folder_cache, max_size=cache_max_size):
+        """On-disk cache of parsed chats stored as NumPy arrays, keyed by the path, size, modification time and
+        content hash of the chat file
+
+        :param folder: folder the cached chats and the index are stored in
+        :type folder: str
+        :param max_size: maximum total size of the cached chats in bytes, the least recently used are removed first
+        :type max_size: int
+        """
+        self.folder = folder
+        self.max_size = max_size
+        self.__index = None
+
+    @property
+    def index(self):
+        """
+        :return: entry per absolute chat file path with its size, mtime, hash, data file size and last use
+        :rtype: dict
+        """
+        if self.__index is None:
+            try:
+                with open(f"{self.folder}/{_index_filename}", "r", encoding="utf-8") as file:
+                    self.__index = _json.load(file)
+            except (OSError, ValueError):
+                self.__index = dict()
+        return self.__index
+
+    def save_index(self):
+        _os.makedirs(self.folder, exist_ok=True)
+        temporary = f"{self.folder}/{_index_filename}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            _json.dump(self.index, file)
+        _os.replace(temporary, f"{self.folder}/{_index_filename}")
+
+    def get_data_path(self, file_hash):
+        return f"{self.folder}/{file_hash}.npz"
+
+    def lookup(self, path):
+        """Find the entry of a file, only hashing its content when its size or modification time changed
+
+        :type path: str
+        :return: entry of the file if its content is cached
+        :rtype: dict or None
+        """
+        path = _os.path.abspath(path)
+        stat = _os.stat(path)
+        entry = self.index.get(path)
+        if entry is not None and entry["version"] == _version \
+                and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            return entry if _os.path.exists(self.get_data_path(entry["hash"])) else None
+
+        file_hash = get_file_hash(path)
+        for other in self.index.values():
+            if other["hash"] == file_hash and other["version"] == _version:
+                self.index[path] = dict(other, size=stat.st_size, mtime=stat.st_mtime_ns)
+                return self.index[path] if _os.path.exists(self.get_data_path(file_hash)) else None
+        return None
+
+    def load(self, path):
+        """
+        :param path: path of the chat file
+        :type path: str
+        :return: arrays stored for the current content of the file, None when it isn't cached
+        :rtype: dict of str to np.ndarray or None
+        """
+        entry = self.lookup(path)
+        if entry is None:
+            return None
+        with _np.load(self.get_data_path(entry["hash"]), allow_pickle=False) as data:
+            arrays = dict(data)
+        entry["used"] = _time.time()
+        self.save_index()
+        return arrays
+
+    def store(self, path, arrays):
+        """
+        :param path: path of the chat file the arrays were parsed from
+        :type path: str
+        :type arrays: dict of str to np.ndarray
+        """
+        path = _os.path.abspath(path)
+        if path in self.index:
+            self.remove(path)
+        stat = _os.stat(path)
+        file_hash = get_file_hash(path)
+        _os.makedirs(self.folder, exist_ok=True)
+        data_path = self.get_data_path(file_hash)
+        with open(data_path, "wb") as file:
+            _np.savez(file, **arrays)
+
+        self.index[path] = dict(version=_version, size=stat.st_size, mtime=stat.st_mtime_ns, hash=file_hash,
+                                data_size=_os.path.getsize(data_path), used=_time.time())
+        self.evict()
+        self.save_index()
+
+    def get_size(self):
+        """
+        :return: total size of the cached chats in bytes
+        :rtype: int
+        """
+        return sum({entry["hash"]: entry["data_size"] for entry in self.index.values()}.values())
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in its maximum size"""
+        for path in sorted(self.index, key=lambda key: self.index[key]["used"]):
+            if self.get_size() <= self.max_size:
+                break
+            self.remove(path)
+
+    def remove(self, path):
+        """
+        :param path: absolute path of the chat file
+        :type path: str
+        """
+        entry = self.index.pop(path)
+        if all(other["hash"] != entry["hash"] for other in self.index.values()):
+            try:
+                _os.remove(self.get_data_path(entry["hash"]))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        for path in list(self.index):
+            self.remove(path)
+        self.save_index()
+
+
+class _Uncacheable(Exception):
+    pass
+
+
+def _freeze(value):
+    """
+    :return: hashable stand-in for an argument, chats and columns are replaced by their fingerprint
+    :raises _Uncacheable: for arguments that can't be compared cheaply, like lists of Message or DataFrames
+    """
+    fingerprint = getattr(value, "fingerprint", None)
+    if callable(fingerprint):
+        return type(value).__name__, fingerprint()
+    if value is None or isinstance(value, (str, int, float, bytes, _datetime.date, _datetime.time,
+                                           _datetime.timedelta)):
+        return value
+    if isinstance(value, (list, tuple, range)):
+        return type(value).__name__, tuple(_freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return "set", frozenset(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return "dict", tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    raise _Uncacheable(type(value).__name__)
+
+
+def _is_copy_on_write():
+    import pandas
+
+    return int(pandas.__version__.split(".")[0]) >= 3 or pandas.options.mode.copy_on_write is True
+
+
+def _copy_result(result):
+    """
+    :return: result that can be changed without changing the cached result, NumPy arrays are read-only instead
+    """
+    if isinstance(result, _np.ndarray):
+        view = result.view()
+        view.flags.writeable = False
+        return view
+    if hasattr(result, "memory_usage"):
+        # With copy-on-write a DataFrame or Series only copies its data once either copy is changed
+        return result.copy(deep=not _is_copy_on_write())
+    if isinstance(result, dict):
+        return {key: _copy_result(item) for key, item in result.items()}
+    if isinstance(result, list):
+        return list(_copy_result(item) for item in result)
+    return result
+
+
+def _get_size(result):
+    """
+    :return: approximate amount of bytes the result takes
+    :rtype: int
+    """
+    if isinstance(result, _np.ndarray):
+        return result.nbytes
+    if hasattr(result, "memory_usage"):
+        usage = result.memory_usage(deep=True)
+        return int(usage if isinstance(usage, int) else usage.sum())
+    if isinstance(result, dict):
+        return _sys.getsizeof(result) + sum(_get_size(key) + _get_size(item) for key, item in result.items())
+    if isinstance(result, (list, tuple)):
+        return _sys.getsizeof(result) + sum(_get_size(item) for item in result)
+    return _sys.getsizeof(result)
+
+
+class ResultCache:
+    def __init__(self, max_items=result_cache_max_items, max_memory=result_cache_max_memory):
+        """Results kept in memory, keyed by the function and its arguments with chats replaced by their fingerprint
+
+        The least recently used results are removed first. Every call returns a copy of the cached result, so
+        changing a result doesn't change the next one.
+
+        :param max_items: maximum amount of results
+        :type max_items: int
+        :param max_memory: maximum total size of the results in bytes, larger results are never kept
+        :type max_memory: int
+        """
+        self.max_items = max_items
+        self.max_memory = max_memory
+        self.entries = _collections.OrderedDict()
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def call(self, function, args, kwargs):
+        """
+        :type function: function
+        :type args: tuple
+        :type kwargs: dict
+        :return: the cached result of the call, or the result of calling the function now
+        """
+        try:
+            key = (function.__module__, function.__qualname__, _freeze(args), _freeze(kwargs))
+        except _Uncacheable:
+            return function(*args, **kwargs)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return _copy_result(entry[0])
+
+        self.misses += 1
+        result = function(*args, **kwargs)
+        self.store(key, result)
+        return _copy_result(result)
+
+    def store(self, key, result):
+        size = _get_size(result)
+        if size > self.max_memory:
+            return
+        self.entries[key] = (result, size)
+        self.memory += size
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used results until the cache fits in its maximum amount and size"""
+        while len(self.entries) > self.max_items or self.memory > self.max_memory:
+            _, (_, size) = self.entries.popitem(last=False)
+            self.memory -= size
+
+    def clear(self):
+        self.entries.clear()
+        self.memory = 0
+
+    def get_info(self):
+        """
+        :return: amount of results, their size in bytes, and the amount of calls answered from and not from the cache
+        :rtype: dict
+        """
+        return dict(items=len(self.entries), memory=self.memory, hits=self.hits, misses=self.misses)
+
+
+def enable_result_cache(max_items=result_cache_max_items, max_memory=result_cache_max_memory):
+    """Keep the results of memoized functions from now on, nothing is cached until this is called
+
+    :param max_items: maximum amount of results
+    :type max_items: int
+    :param max_memory: maximum total size of the results in bytes
+    :type max_memory: int
+    :rtype: ResultCache
+    """
+    global _result_cache
+    _result_cache = ResultCache(max_items, max_memory)
+    return _result_cache
+
+
+def disable_result_cache():
+    global _result_cache
+    _result_cache = None
+
+
+def get_result_cache():
+    """
+    :return: the result cache, None when it isn't enabled
+    :rtype: None or ResultCache
+    """
+    return _result_cache
+
+
+def memoize(function):
+    """Decorator answering calls from the result cache when it's enabled, for functions of chats without side effects
+
+    :type function: function
+    :rtype: function
+    """
+    @_functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if _result_cache is None:
+            return function(*args, **kwargs)
+        return _result_cache.call(function, args, kwargs)
+    return wrapper
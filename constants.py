@@ -9,6 +9,20 @@ def read_file(file_path):
 # Constants
 min_word_frequency_length = 5  # characters
 max_cluster_time_interval = 30  # minutes
+format_detection_lines = 100  # lines sampled to detect the date format of a chat
+cache_max_size = 1024 ** 3  # bytes
+min_chunk_size = 8 * 1024 ** 2  # bytes of a chat file parsed by one process
+report_dpi = 150  # resolution word clouds are sized for in reports, and figures are rasterized at if asked
+max_plot_points = 1000  # points per line figure, longer series are downsampled
+mapped_batch_size = 64 * 1024  # messages decoded at once from a memory-mapped chat file
+min_automaton_patterns = 200  # literal patterns searched at once before an Aho-Corasick automaton is faster
+tail_check_size = 64 * 1024  # bytes compared to check a followed chat file was only appended to
+vocabulary_memory = 64 * 1024 ** 2  # bytes of counted words, word counts become approximate beyond it
+vocabulary_top = 200  # words kept with their counts once word counts are approximate
+sketch_error = 0.00001  # maximum overestimate of approximate word counts as a part of all words, if memory allows
+sketch_failure_probability = 0.01  # probability an approximate word count is off by more than sketch_error
+result_cache_max_items = 256  # results of ChatData kept in memory when the result cache is enabled
+result_cache_max_memory = 256 * 1024 ** 2  # bytes
 
 
 # Character filters
@@ -49,6 +63,10 @@ class Date:
 class Directory:
     folder_filter = "filters"
     folder_chats = "chats"
+    folder_cache = "cache"
+    folder_benchmarks = "benchmarks"
+    folder_benchmark_chats = "benchmark"  # inside folder_chats
+    file_store = "chats.sqlite"
     files_messages = "messages"
     files_words = "words"
 
@@ -65,6 +83,26 @@ class Result:
 
     all = [minute, hour, day, week, month, date, year, author]
 
+    lengths = "message_lengths"
+    starters = "chat_starters"
+    enders = "chat_enders"
+    letters = "letters"
+    media = "media"
+
+    statistics = all + [lengths, starters, enders, letters, media]
+
+
+class Stage:
+    read = "read"
+    parse = "parse"
+    filter = "filter"
+    convert = "convert"
+    sort = "sort"
+    aggregate = "aggregate"
+    render = "render"
+
+    all = [read, parse, filter, convert, sort, aggregate, render]
+
 
 class Format:
     time = "[0-9][0-9]:[0-9][0-9]"
@@ -77,23 +115,40 @@ class Format:
                    date_2: "[0-9]{1,2}/[0-9]{1,2}/[0-9][0-9],",
                    date_3: "[0-9][0-9]-[0-9][0-9]-[0-9][0-9],"}
 
-
-class Filter:
-    announcement = "Whatsapp Announcement"
-    sentences = list()
-    words = set()
-
-    for file in listdir(Directory.folder_filter):
-        if file.endswith(".txt"):
-            filename = f"{Directory.folder_filter}/{file}"
-            if file.startswith(Directory.files_messages):
-                sentences.extend(read_file(filename))
-            elif file.startswith(Directory.files_words):
-                words.update(filename)
-    words.update(alphabet_array)
-
+    # Start of a message line up to the author, the last three characters separate the time from the author
+    regex_messages = {date_1: "(?P<date>(?P<day>[0-9][0-9])-(?P<month>[0-9][0-9])-(?P<year>[0-9]{4})) "
+                              "(?P<time>(?P<hour>[0-9][0-9]):(?P<minute>[0-9][0-9])).{0,3}",
+                      date_2: "(?P<date>(?P<month>[0-9]{1,2})/(?P<day>[0-9]{1,2})/(?P<year>[0-9][0-9])), "
+                              "(?P<time>(?P<hour>[0-9][0-9]):(?P<minute>[0-9][0-9])).{0,3}",
+                      date_3: "(?P<date>(?P<day>[0-9][0-9])-(?P<month>[0-9][0-9])-(?P<year>[0-9][0-9])), "
+                              "(?P<time>(?P<hour>[0-9][0-9]):(?P<minute>[0-9][0-9])).{0,3}"}
+    year_offsets = {date_1: 0, date_2: 2000, date_3: 2000}
 
 
+class _LazyFilter(type):
+    def __getattr__(cls, name):
+        """Read the filter files on the first use of the filter lists, later uses get the stored lists directly"""
+        if name not in ("sentences", "words"):
+            raise AttributeError(name)
+        cls.load()
+        return type.__getattribute__(cls, name)
 
 
+class Filter(metaclass=_LazyFilter):
+    announcement = "Whatsapp Announcement"
 
+    @classmethod
+    def load(cls):
+        """Read the sentences and words to filter from the files in the filter folder"""
+        sentences = list()
+        words = set()
+        for file in sorted(listdir(Directory.folder_filter)):
+            if file.endswith(".txt"):
+                filename = f"{Directory.folder_filter}/{file}"
+                if file.startswith(Directory.files_messages):
+                    sentences.extend(read_file(filename))
+                elif file.startswith(Directory.files_words):
+                    words.update(read_file(filename))
+        words.update(alphabet_array)
+        cls.sentences = sentences
+        cls.words = words
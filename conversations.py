@@ -0,0 +1,110 @@
+import numpy as _np
+import pandas as _pd
+
+from constants import max_cluster_time_interval
+
+
+class Conversations:
+    def __init__(self, columns, authors, max_interval=max_cluster_time_interval):
+        """Split a chat into conversations, a new conversation starts when nobody sent a message for longer than the
+        maximum interval
+
+        All conversations and statistics are computed at once from the timestamps and author codes.
+
+        :param columns: messages of the chat, sorted by time
+        :type columns: message.MessageColumns
+        :param authors: authors to report statistics for, like Chat.authors
+        :type authors: list of str
+        :param max_interval: maximum amount of minutes between messages before a new conversation starts
+        :type max_interval: int
+        """
+        self.authors = authors
+        self.timestamps = columns.timestamps
+        self.length = len(columns)
+
+        self.author_codes = columns.recode(authors).astype(_np.int64)
+
+        # Seconds since the previous message, the first message has no previous message
+        self.gaps = _np.diff(self.timestamps)
+        is_start = _np.concatenate(([True], self.gaps > max_interval * 60))[:self.length]
+        self.conversation_ids = _np.cumsum(is_start) - 1
+        self.starts = _np.flatnonzero(is_start)
+        self.ends = _np.concatenate((self.starts[1:], [self.length])) - 1
+
+    def __len__(self):
+        return len(self.starts)
+
+    def count_per_author(self, positions):
+        """
+        :param positions: positions of messages
+        :type positions: np.ndarray
+        :return: number of messages per author, in the order of authors
+        :rtype: np.ndarray
+        """
+        codes = self.author_codes[positions]
+        return _np.bincount(codes[codes >= 0], minlength=len(self.authors))
+
+    def get_participants(self):
+        """
+        :return: number of different authors in every conversation
+        :rtype: np.ndarray
+        """
+        pairs = _np.sort(self.conversation_ids * (len(self.authors) + 1) + self.author_codes + 1)
+        # Sorting and comparing neighbours is much faster than np.unique
+        pairs = pairs[_np.concatenate(([True], pairs[1:] != pairs[:-1]))] if len(pairs) else pairs
+        return _np.bincount(pairs // (len(self.authors) + 1), minlength=len(self))
+
+    def get_replies(self):
+        """A reply is a message in the same conversation as the previous message, by a different author
+
+        :return: position of every reply and the seconds it took to send it
+        :rtype: (np.ndarray, np.ndarray)
+        """
+        is_reply = (self.conversation_ids[1:] == self.conversation_ids[:-1]) & \
+                   (self.author_codes[1:] != self.author_codes[:-1])
+        return _np.flatnonzero(is_reply) + 1, self.gaps[is_reply]
+
+    def get_conversations(self):
+        """
+        :return: start, end, number of messages, duration in minutes, number of participants, author of the first
+            and author of the last message of every conversation
+        :rtype: pd.DataFrame
+        """
+        authors = _np.array(self.authors + [None], dtype=object)
+        return _pd.DataFrame({"Start": _pd.to_datetime(self.timestamps[self.starts], unit="s"),
+                              "End": _pd.to_datetime(self.timestamps[self.ends], unit="s"),
+                              "Messages": self.ends - self.starts + 1,
+                              "Duration (minutes)": (self.timestamps[self.ends] - self.timestamps[self.starts]) // 60,
+                              "Participants": self.get_participants(),
+                              "Started by": authors[self.author_codes[self.starts]],
+                              "Ended by": authors[self.author_codes[self.ends]]})
+
+    def get_author_statistics(self):
+        """
+        :return: conversations started and ended, number of replies and the mean and median reply time in minutes
+            of every author
+        :rtype: pd.DataFrame
+        """
+        positions, latencies = self.get_replies()
+        codes = self.author_codes[positions]
+        latencies = latencies[codes >= 0] / 60
+        codes = codes[codes >= 0]
+        replies = _np.bincount(codes, minlength=len(self.authors))
+
+        order = _np.lexsort((latencies, codes))
+        latencies = latencies[order]
+        firsts = _np.cumsum(replies) - replies
+        has_replies = replies > 0
+        medians = _np.full(len(self.authors), _np.nan)
+        medians[has_replies] = (latencies[(firsts + (replies - 1) // 2)[has_replies]] +
+                                latencies[(firsts + replies // 2)[has_replies]]) / 2
+        means = _np.full(len(self.authors), _np.nan)
+        means[has_replies] = _np.bincount(codes, weights=latencies[_np.argsort(order)],
+                                          minlength=len(self.authors))[has_replies] / replies[has_replies]
+
+        return _pd.DataFrame(index=self.authors,
+                             data={"Chats started": self.count_per_author(self.starts),
+                                   "Chats ended": self.count_per_author(self.ends),
+                                   "Replies": replies,
+                                   "Mean reply time (minutes)": means,
+                                   "Median reply time (minutes)": medians})
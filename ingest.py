@@ -0,0 +1,423 @@
+import array as _array
+import hashlib as _hashlib
+import itertools as _itertools
+import mmap as _mmap
+import os as _os
+import re as _re
+from concurrent.futures import ProcessPoolExecutor as _ProcessPoolExecutor
+
+import numpy as _np
+
+from constants import Directory, Filter, Format, format_detection_lines, min_chunk_size, tail_check_size
+from menu import get_chat_filenames
+from message import Chat, MappedColumns, MessageColumns, clean_mapped_content, detect_date_format, filter_messages, \
+    get_parser
+
+
+def decode_line(line):
+    """
+    :param line: line read from a chat file opened in binary mode
+    :type line: bytes
+    :return: line without line ending
+    :rtype: str
+    """
+    line = line.decode("utf-8")
+    if line.endswith("\n"):
+        line = line[:-1]
+    if line.endswith("\r"):
+        line = line[:-1]
+    return line
+
+
+class IncrementalChat:
+    def __init__(self, filename, name=""):
+        """Chat that is parsed again from the last message on when its file has only been appended to
+
+        Every update remembers where the last message starts in the file and a hash of everything before it. When the
+        file still starts with the same content on the next update, only the last message and the lines after it are
+        parsed, otherwise the whole file is parsed again.
+
+        :param filename: chat file located in the folder specified in constants
+        :type filename: str
+        :type name: str
+        """
+        self.filename = filename
+        self.name = name
+
+        self.date_format = None
+        self.resume_offset = 0
+        self.prefix_hash = None
+        self.columns = None
+        self.window_hash = None
+
+    def get_path(self):
+        return f"{Directory.folder_chats}/{self.filename}"
+
+    def __verify_prefix(self, file):
+        """
+        :param file: chat file opened in binary mode
+        :return: hash of the part of the file that was parsed before if it didn't change, otherwise None
+        :rtype: hashlib.blake2b or None
+        """
+        if self.columns is None:
+            return None
+        prefix_hash = _hashlib.blake2b(digest_size=16)
+        remaining = self.resume_offset
+        while remaining > 0:
+            block = file.read(min(remaining, 1024 ** 2))
+            if not block:
+                return None
+            prefix_hash.update(block)
+            remaining -= len(block)
+        return prefix_hash if prefix_hash.hexdigest() == self.prefix_hash else None
+
+    def __read_lines(self, lines, prefix_hash, match):
+        """Decode lines while tracking where the last message starts and hashing everything before it
+
+        :type lines: Iterable of bytes
+        :param prefix_hash: hash to update with everything before the last message, None to skip hashing
+        :type prefix_hash: None or hashlib.blake2b
+        :param match: match function of the message parser
+        :type match: function
+        :rtype: generator of str
+        """
+        offset = self.resume_offset
+        pending = list()
+        for line in lines:
+            decoded = decode_line(line)
+            if match(decoded):
+                if prefix_hash is not None:
+                    for block in pending:
+                        prefix_hash.update(block)
+                pending.clear()
+                self.resume_offset = offset
+            pending.append(line)
+            offset += len(line)
+            yield decoded
+
+    def update(self, filename=None):
+        """Parse what was appended to the chat file since the last update
+
+        :param filename: new export of the same chat, replacing the file of the previous update
+        :type filename: None or str
+        :rtype: Chat
+        """
+        if filename is not None:
+            self.filename = filename
+        with open(self.get_path(), "rb") as file:
+            prefix_hash = self.__verify_prefix(file)
+            if prefix_hash is None:
+                file.seek(0)
+                sample = list(_itertools.islice(file, format_detection_lines))
+                self.date_format = detect_date_format(decode_line(line) for line in sample)
+                self.resume_offset = 0
+                self.columns = MessageColumns.empty()
+                prefix_hash = _hashlib.blake2b(digest_size=16)
+                lines = _itertools.chain(sample, file)
+            else:
+                lines = file
+
+            parser = get_parser(self.date_format)
+            last = list()
+            messages = parser.parse_lines(self.__read_lines(lines, prefix_hash, parser.match))
+            complete = MessageColumns.from_messages(filter_messages(_hold_last(messages, last)))
+
+        # The last message can still get continuation lines, so it's parsed again on the next update
+        self.columns = MessageColumns.merge(self.columns, complete.sort())
+        self.prefix_hash = prefix_hash.hexdigest()
+        last = MessageColumns.from_messages(filter_messages(last))
+        return Chat.from_message_array(MessageColumns.merge(self.columns, last), self.name)
+
+    def __get_window_hash(self, file):
+        """
+        :param file: chat file opened in binary mode
+        :return: hash of the part of the file right before where the last message starts
+        :rtype: str
+        """
+        start = max(0, self.resume_offset - tail_check_size)
+        file.seek(start)
+        window = file.read(self.resume_offset - start)
+        return _hashlib.blake2b(window + self.resume_offset.to_bytes(8, "little"), digest_size=16).hexdigest()
+
+    def read_appended(self):
+        """Parse only the messages completed since the last call, without keeping the messages of the whole chat
+
+        Only a window of the file before the last message is compared, so whether the file was appended to is checked
+        in constant time. Use either this or update on the same object, not both.
+
+        :return: messages completed since the last call, and whether the whole file was parsed again because it
+            wasn't only appended to
+        :rtype: (MessageColumns, bool)
+        """
+        with open(self.get_path(), "rb") as file:
+            # Nothing was completed before when the first message still starts at the beginning of the file
+            reparsed = self.window_hash is None or self.resume_offset == 0 or \
+                _os.fstat(file.fileno()).st_size < self.resume_offset or \
+                self.__get_window_hash(file) != self.window_hash
+            if reparsed:
+                file.seek(0)
+                sample = list(_itertools.islice(file, format_detection_lines))
+                self.date_format = detect_date_format(decode_line(line) for line in sample)
+                self.resume_offset = 0
+                lines = _itertools.chain(sample, file)
+            else:
+                file.seek(self.resume_offset)
+                lines = file
+
+            parser = get_parser(self.date_format)
+            last = list()
+            messages = parser.parse_lines(self.__read_lines(lines, None, parser.match))
+            complete = MessageColumns.from_messages(filter_messages(_hold_last(messages, last)))
+            # The last message can still get continuation lines, so it's parsed again on the next call
+            self.window_hash = self.__get_window_hash(file)
+        return complete, reparsed
+
+    def save(self, path):
+        """
+        :param path: file to store the parsed messages and how far the chat file was parsed in
+        :type path: str
+        """
+        with open(path, "wb") as file:
+            _np.savez(file, filename=_np.array(self.filename), name=_np.array(self.name),
+                      date_format=_np.array(self.date_format), resume_offset=_np.array(self.resume_offset),
+                      prefix_hash=_np.array(self.prefix_hash), **self.columns.to_arrays())
+
+    @staticmethod
+    def load(path):
+        """
+        :param path: file created by save
+        :type path: str
+        :rtype: IncrementalChat
+        """
+        with _np.load(path, allow_pickle=False) as data:
+            arrays = dict(data)
+        chat = IncrementalChat(str(arrays["filename"]), str(arrays["name"]))
+        chat.date_format = str(arrays["date_format"])
+        chat.resume_offset = int(arrays["resume_offset"])
+        chat.prefix_hash = str(arrays["prefix_hash"])
+        chat.columns = MessageColumns.from_arrays(arrays)
+        return chat
+
+
+def read_lines(file, end):
+    """
+    :param file: chat file opened in binary mode, positioned at the start of a line
+    :param end: offset in the file to stop at, the line containing it is still read completely
+    :type end: int
+    :rtype: generator of bytes
+    """
+    while file.tell() < end:
+        line = file.readline()
+        if not line:
+            return
+        yield line
+
+
+def get_chunk_offsets(path, date_format, chunks):
+    """Split a chat file into chunks of about the same size, which all start with a message
+
+    :type path: str
+    :param date_format: DD-MM-YYYY or MM/DD/YY or DD-MM-YY
+    :type date_format: str
+    :param chunks: maximum amount of chunks
+    :type chunks: int
+    :return: start offset of every chunk, followed by the size of the file
+    :rtype: list of int
+    """
+    size = _os.path.getsize(path)
+    chunks = max(1, min(chunks, size // min_chunk_size))
+    match = get_parser(date_format).match
+    offsets = [0]
+    with open(path, "rb") as file:
+        for chunk in range(1, chunks):
+            file.seek(max(chunk * size // chunks, offsets[-1]))
+            file.readline()
+            offset = file.tell()
+            for line in iter(file.readline, b""):
+                if match(line.decode("utf-8", errors="replace")):
+                    break
+                offset = file.tell()
+            if offsets[-1] < offset < size:
+                offsets.append(offset)
+    offsets.append(size)
+    return offsets
+
+
+def parse_chunk(path, date_format, start, end):
+    """
+    :type path: str
+    :type date_format: str
+    :param start: offset of the first message of the chunk
+    :type start: int
+    :param end: offset of the first message after the chunk
+    :type end: int
+    :return: messages of the chunk, sorted by time
+    :rtype: MessageColumns
+    """
+    with open(path, "rb") as file:
+        file.seek(start)
+        lines = (decode_line(line) for line in read_lines(file, end))
+        return MessageColumns.from_messages(filter_messages(get_parser(date_format).parse_lines(lines))).sort()
+
+
+def parse_file_parallel(filename, name="", processes=None):
+    """Create Chat object from a text file located in the folder specified in constants, parsing chunks of the file
+    on multiple processes
+
+    :type filename: str
+    :type name: str
+    :param processes: amount of processes, defaults to the amount of CPUs
+    :type processes: None or int
+    :rtype: Chat
+    """
+    path = f"{Directory.folder_chats}/{filename}"
+    with open(path, "rb") as file:
+        sample = list(decode_line(line) for line in _itertools.islice(file, format_detection_lines))
+    date_format = detect_date_format(sample)
+
+    offsets = get_chunk_offsets(path, date_format, processes or _os.cpu_count())
+    if len(offsets) == 2:
+        return Chat.from_message_array(parse_chunk(path, date_format, *offsets), name)
+    with _ProcessPoolExecutor(processes) as executor:
+        chunks = list(executor.map(parse_chunk, _itertools.repeat(path), _itertools.repeat(date_format),
+                                   offsets[:-1], offsets[1:]))
+    return Chat.from_message_array(MessageColumns.concatenate(chunks), name)
+
+
+def load_chats(filenames=None, names=None, processes=None):
+    """Create a Chat object for every chat file, parsing the files on multiple processes
+
+    :param filenames: text files located in the folder specified in constants, defaults to all of them
+    :type filenames: None or list of str
+    :param names: name of every chat, defaults to the filenames
+    :type names: None or list of str
+    :param processes: amount of processes, defaults to the amount of CPUs
+    :type processes: None or int
+    :rtype: list of Chat
+    """
+    filenames = get_chat_filenames() if filenames is None else filenames
+    names = filenames if names is None else names
+    with _ProcessPoolExecutor(processes) as executor:
+        columns = list(executor.map(_parse_file, filenames))
+    return list(Chat.from_message_array(messages, name) for messages, name in zip(columns, names))
+
+
+def get_mapped_pattern(date_format):
+    """
+    :param date_format: DD-MM-YYYY or MM/DD/YY or DD-MM-YY
+    :type date_format: str
+    :return: bytes pattern matching the start of every message line up to the author and the colon after it, the
+        colon is missing when the first line of the message has none
+    :rtype: re.Pattern
+    """
+    return _re.compile(b"^(?:" + Format.regex_messages[date_format].encode("ascii") +
+                       b")(?P<author>[^:\n]*)(?P<colon>:)?", _re.MULTILINE)
+
+
+def parse_file_mapped(filename, name=""):
+    """Create Chat object from a text file located in the folder specified in constants without reading it into
+    memory
+
+    The file is memory-mapped and the messages are found with a bytes pattern. Only the date, time and author of
+    every message are decoded, the contents stay offsets into the file until they're requested, so files larger
+    than the available memory can be analysed. The messages are the same as Chat.from_file creates.
+
+    :type filename: str
+    :type name: str
+    :rtype: Chat
+    """
+    path = f"{Directory.folder_chats}/{filename}"
+    with open(path, "rb") as file:
+        data = _mmap.mmap(file.fileno(), 0, access=_mmap.ACCESS_READ)
+        stat = _os.fstat(file.fileno())
+    date_format = detect_date_format(decode_line(line) for line in
+                                     _itertools.islice(iter(data.readline, b""), format_detection_lines))
+    parser = get_parser(date_format)
+
+    dates = dict()
+    times = dict()
+    author_codes = dict()
+    timestamps = _array.array("q")
+    codes = _array.array("q")
+    lines = _array.array("q")
+    headers = _array.array("q")
+    starts = _array.array("q")
+    for match in get_mapped_pattern(date_format).finditer(data):
+        # Every distinct date, time of day and author is only converted once
+        date_key, time_key, author, colon = match.group("date", "time", "author", "colon")
+        date = dates.get(date_key)
+        if date is None:
+            date = dates[date_key] = parser.get_date(match)
+        time = times.get(time_key)
+        if time is None:
+            time = times[time_key] = parser.get_time(match)
+        timestamps.append(date + time)
+        lines.append(match.start())
+        headers.append(match.start("author"))
+        if colon is None:
+            codes.append(-1)
+            starts.append(match.end())
+        else:
+            codes.append(author_codes.setdefault(author, len(author_codes)))
+            # The content starts after the colon and the space following it
+            starts.append(match.end() + 1)
+
+    timestamps = _np.frombuffer(timestamps, dtype=_np.int64)
+    codes = _np.frombuffer(codes, dtype=_np.int64)
+    headers = _np.frombuffer(headers, dtype=_np.int64)
+    starts = _np.frombuffer(starts, dtype=_np.int64)
+    # A message ends at the line break before the next message, the line break ending the file isn't part of it
+    ends = _np.append(_np.frombuffer(lines, dtype=_np.int64)[1:] - 1, len(data) - (data[-1:] == b"\n"))
+    before_ends = _np.frombuffer(data, dtype=_np.uint8)[_np.maximum(ends - 1, 0)]
+    ends -= (before_ends == ord("\r")) & (ends > headers)
+
+    # Without a colon on its first line the author ends at the first colon of a later line, without any colon
+    # the message is an announcement
+    for i in _np.flatnonzero(codes == -1).tolist():
+        colon = data.find(b":", int(headers[i]), int(ends[i]))
+        if colon != -1:
+            codes[i] = author_codes.setdefault(data[int(headers[i]):colon], len(author_codes))
+            starts[i] = colon + 2
+    starts = _np.minimum(starts, ends)
+
+    names = list(clean_mapped_content(author).decode("utf-8") for author in author_codes)
+    authors = sorted(set(names) - {Filter.announcement})
+    positions = {author: code for code, author in enumerate(authors)}
+    # Announcements have code -1, which the extra last entry of the lookup table keeps at -1
+    lookup = _np.array(list(positions.get(author, -1) for author in names) + [-1], dtype=_np.int32)
+    codes = lookup[codes]
+    keep = codes >= 0
+
+    # Contents that are filter sentences are emptied, the first sentence marks media
+    media = _np.zeros(len(codes), dtype=bool)
+    sentences = set(sentence.encode("utf-8") for sentence in Filter.sentences if sentence)
+    lengths = ends - starts
+    for i in _np.flatnonzero(keep & _np.isin(lengths, list(set(map(len, sentences))))).tolist():
+        content = data[int(starts[i]):int(ends[i])]
+        if content in sentences:
+            media[i] = content == Filter.sentences[0].encode("utf-8")
+            ends[i] = starts[i]
+
+    columns = MappedColumns(data, starts[keep], ends[keep], timestamps[keep], codes[keep], authors, media[keep],
+                            (_os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+    return Chat.from_message_array(columns, name)
+
+
+def _parse_file(filename):
+    return Chat.from_file(filename, columnar=True).columns
+
+
+def _hold_last(items, last):
+    """Yield all items except the last one, which is put in the last list instead
+
+    :type items: Iterable
+    :type last: list
+    :rtype: generator
+    """
+    previous = last
+    for item in items:
+        if previous is not last:
+            yield previous
+        previous = item
+    if previous is not last:
+        last.append(previous)
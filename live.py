@@ -0,0 +1,315 @@
+import itertools as _itertools
+import os as _os
+import time as _time
+from collections import Counter as _Counter
+
+import numpy as _np
+import pandas as _pd
+
+from constants import Date, Result, Stage, alphabet, alphabet_array, mapped_batch_size, max_cluster_time_interval
+from ingest import IncrementalChat
+from message import MessageColumns, get_day_buckets, get_day_keys
+import profiling as _profiling
+
+
+class LiveAggregator:
+    def __init__(self, max_interval=max_cluster_time_interval):
+        """Statistics of a chat that keep up with new messages, every update only looks at the new messages
+
+        Snapshots are the same DataFrames ChatData returns for a chat with all messages added so far. Messages should
+        be added in time order, a message older than the newest one is counted in every statistic but joins the
+        conversation of the newest message.
+
+        :param max_interval: maximum amount of minutes between messages before a new conversation starts
+        :type max_interval: int
+        """
+        self.max_interval = max_interval
+        self.reset()
+
+    def reset(self):
+        """Forget every message added so far"""
+        self.length = 0
+        self.media = 0
+        self.minutes = _np.zeros(24 * 60, dtype=_np.int64)
+        self.weekdays = _np.zeros(len(Date.weekdays), dtype=_np.int64)
+        self.days = _Counter()
+        self.words = _Counter()
+
+        # Authors in the order they first sent a message, with their statistics in the same order
+        self.authors = list()
+        self.__author_codes = dict()
+        self.message_counts = _np.zeros(0, dtype=_np.int64)
+        self.word_counts = _np.zeros(0, dtype=_np.int64)
+        self.character_counts = _np.zeros(0, dtype=_np.int64)
+        self.letter_counts = _np.zeros((0, len(alphabet)), dtype=_np.int64)
+        self.starters = _np.zeros(0, dtype=_np.int64)
+        # Only finished conversations, the last conversation ends with the newest message
+        self.enders = _np.zeros(0, dtype=_np.int64)
+
+        self.last_timestamp = None
+        self.last_author = -1
+
+    def __len__(self):
+        return self.length
+
+    def __get_codes(self, authors):
+        """
+        :param authors: lookup table of author names of new messages
+        :type authors: list of str
+        :return: code of every author in authors, authors that are new get the next code
+        :rtype: np.ndarray
+        """
+        for author in authors:
+            if author not in self.__author_codes:
+                self.__author_codes[author] = len(self.authors)
+                self.authors.append(author)
+        added = len(self.authors) - len(self.message_counts)
+        if added:
+            counts = (self.message_counts, self.word_counts, self.character_counts, self.starters, self.enders)
+            self.message_counts, self.word_counts, self.character_counts, self.starters, self.enders = (
+                _np.concatenate((author_counts, _np.zeros(added, dtype=_np.int64))) for author_counts in counts)
+            self.letter_counts = _np.concatenate((self.letter_counts,
+                                                  _np.zeros((added, len(alphabet)), dtype=_np.int64)))
+        return _np.array(list(self.__author_codes[author] for author in authors), dtype=_np.int64)
+
+    @_profiling.profile(Stage.aggregate, lambda self, columns: len(columns))
+    def add_columns(self, columns):
+        """
+        :param columns: new messages
+        :type columns: MessageColumns
+        """
+        if len(columns) == 0:
+            return
+        columns = columns.sort()
+        codes = self.__get_codes(columns.authors)[columns.author_codes]
+        timestamps = columns.timestamps
+        authors = len(self.authors)
+
+        self.length += len(columns)
+        self.media += int(_np.count_nonzero(columns.media))
+        self.minutes += _np.bincount(timestamps % 86400 // 60, minlength=len(self.minutes))
+        days = timestamps // 86400
+        self.weekdays += _np.bincount(get_day_keys(days, Result.day, Date.weekdays), minlength=len(self.weekdays))
+        self.days.update(dict(zip(*(values.tolist() for values in _np.unique(days, return_counts=True)))))
+
+        word_lists = columns.get_word_lists()
+        self.words.update(_itertools.chain.from_iterable(word_lists))
+        self.message_counts += _np.bincount(codes, minlength=authors)
+        self.word_counts += _np.bincount(codes, weights=columns.word_counts(), minlength=authors).astype(_np.int64)
+        self.character_counts += _np.bincount(codes, weights=columns.lengths(), minlength=authors).astype(_np.int64)
+        self.letter_counts += columns.letter_counts(codes, authors)
+
+        if self.last_timestamp is not None:
+            timestamps = _np.maximum(timestamps, self.last_timestamp)
+        gaps = _np.diff(timestamps, prepend=timestamps[0] if self.last_timestamp is None else self.last_timestamp)
+        is_start = gaps > self.max_interval * 60
+        if self.last_timestamp is None:
+            is_start[0] = True
+        self.starters += _np.bincount(codes[is_start], minlength=authors)
+        # The message before every new conversation ended the previous one
+        previous_codes = _np.concatenate(([self.last_author], codes[:-1]))
+        enders = previous_codes[is_start]
+        self.enders += _np.bincount(enders[enders >= 0], minlength=authors)
+
+        self.last_timestamp = int(timestamps[-1])
+        self.last_author = int(codes[-1])
+
+    def add_messages(self, messages):
+        """
+        :param messages: new messages
+        :type messages: Iterable of Message
+        """
+        self.add_columns(MessageColumns.from_messages(messages))
+
+    def feed(self, messages, batch_size=mapped_batch_size):
+        """Add messages from a stream in batches, so snapshots can be taken while the stream continues
+
+        :param messages: new messages, like a generator that waits for messages to arrive
+        :type messages: Iterable of Message
+        :param batch_size: maximum amount of messages added at once
+        :type batch_size: int
+        :return: this aggregator after every batch
+        :rtype: generator of LiveAggregator
+        """
+        messages = iter(messages)
+        while batch := list(_itertools.islice(messages, batch_size)):
+            self.add_messages(batch)
+            yield self
+
+    def get_authors(self):
+        """
+        :return: authors of the added messages, sorted like Chat.authors
+        :rtype: list of str
+        """
+        return sorted(self.authors)
+
+    def __by_author(self, counts):
+        """
+        :param counts: statistics in the order authors first sent a message
+        :type counts: np.ndarray
+        :return: statistics in the order of get_authors
+        :rtype: np.ndarray
+        """
+        return counts[list(self.__author_codes[author] for author in self.get_authors())]
+
+    def from_command(self, data_type, column="Messages"):
+        """
+        :param data_type: one of Result.all
+        :type data_type: str
+        :type column: Any
+        :return: the same as ChatData.from_command_chat
+        :rtype: pd.DataFrame
+        """
+        if not self.length:
+            return _pd.DataFrame(columns=[column], dtype=_np.int64)
+        match data_type:
+            case Result.minute:
+                return _pd.DataFrame(index=range(24 * 60), columns=[column], data=self.minutes)
+            case Result.hour:
+                hours = self.minutes.reshape(24, 60).sum(axis=1)
+                return _pd.DataFrame(index=range(24), columns=[column], data=hours)
+            case Result.day:
+                return _pd.DataFrame(index=Date.weekdays, columns=[column], data=self.weekdays)
+            case Result.author:
+                return _pd.DataFrame(index=self.get_authors(), columns=[column],
+                                     data=self.__by_author(self.message_counts))
+
+        days = _np.array(list(self.days), dtype=_np.int64)
+        counts = _np.array(list(self.days.values()), dtype=_np.int64)
+        index, keys = get_day_buckets(days, data_type)
+        return _pd.DataFrame(index=index, columns=[column], data=_np.bincount(keys, weights=counts,
+                                                                              minlength=len(index)).astype(_np.int64))
+
+    def chat_starters(self):
+        """
+        :return: the same as ChatData.chat_starters
+        :rtype: pd.DataFrame
+        """
+        return _pd.DataFrame(index=self.get_authors(), data={"Chats started": self.__by_author(self.starters)})
+
+    def chat_enders(self):
+        """
+        :return: the same as ChatData.chat_enders
+        :rtype: pd.DataFrame
+        """
+        enders = self.enders.copy()
+        if self.last_author >= 0:
+            enders[self.last_author] += 1
+        return _pd.DataFrame(index=self.get_authors(), data={"Chats ended": self.__by_author(enders)})
+
+    def message_lengths(self):
+        """Only the lengths per author are kept, the length of every single message would grow with the chat
+
+        :return: the same as ChatData.message_lengths with by_author
+        :rtype: pd.DataFrame
+        """
+        data = _np.column_stack(list(self.__by_author(counts)
+                                     for counts in (self.message_counts, self.word_counts, self.character_counts)))
+        return _pd.DataFrame(index=self.get_authors(), data=data,
+                             columns=["Messages", "Length (words)", "Length (characters)"])
+
+    def letters(self, by_author=False):
+        """
+        :param by_author: a frequency column per author instead of one for the whole chat
+        :type by_author: bool
+        :return: the same as ChatData.letters
+        :rtype: pd.DataFrame
+        """
+        if by_author:
+            return _pd.DataFrame(index=alphabet_array, columns=self.get_authors(),
+                                 data=self.__by_author(self.letter_counts).T)
+        return _pd.DataFrame(index=alphabet_array, columns=["Frequency"], data=self.letter_counts.sum(axis=0))
+
+    def unique_words(self):
+        """
+        :return: the same as ChatData.unique_words
+        :rtype: pd.DataFrame
+        """
+        return _pd.DataFrame(index=list(self.words), columns=["Frequency"], data=list(self.words.values()))
+
+    def count_media(self):
+        return self.media
+
+    def aggregate(self, statistics=Result.statistics, by_author=False):
+        """
+        :param statistics: types from Result.statistics, message lengths are always per author
+        :type statistics: list of str
+        :param by_author: break letters down per author
+        :type by_author: bool
+        :return: the same result per statistic as ChatData.aggregate
+        :rtype: dict of str to pd.DataFrame or int
+        """
+        results = dict()
+        for statistic in statistics:
+            match statistic:
+                case Result.lengths:
+                    results[statistic] = self.message_lengths()
+                case Result.starters:
+                    results[statistic] = self.chat_starters()
+                case Result.enders:
+                    results[statistic] = self.chat_enders()
+                case Result.letters:
+                    results[statistic] = self.letters(by_author)
+                case Result.media:
+                    results[statistic] = self.count_media()
+                case _:
+                    results[statistic] = self.from_command(statistic)
+        return results
+
+
+class LiveChat:
+    def __init__(self, filename, name="", max_interval=max_cluster_time_interval):
+        """Statistics of a chat file that keeps growing, only what was appended to the file is parsed and counted
+
+        The last message of the file is only counted once a message comes after it, as it can still get more lines.
+
+        :param filename: chat file located in the folder specified in constants
+        :type filename: str
+        :type name: str
+        :param max_interval: maximum amount of minutes between messages before a new conversation starts
+        :type max_interval: int
+        """
+        self.chat = IncrementalChat(filename, name)
+        self.aggregator = LiveAggregator(max_interval)
+        self.__file_state = None
+
+    def update(self):
+        """
+        :return: whether the file changed since the last update
+        :rtype: bool
+        """
+        stat = _os.stat(self.chat.get_path())
+        file_state = (stat.st_size, stat.st_mtime_ns)
+        if file_state == self.__file_state:
+            return False
+        self.__file_state = file_state
+        appended, reparsed = self.chat.read_appended()
+        if reparsed:
+            # The file was replaced instead of appended to
+            self.aggregator.reset()
+        self.aggregator.add_columns(appended)
+        return True
+
+    def follow(self, interval=1.0, timeout=None):
+        """Keep checking the file for new messages
+
+        :param interval: seconds between checks
+        :type interval: float
+        :param timeout: stop when the file didn't change for this many seconds, None keeps following forever
+        :type timeout: None or float
+        :return: the aggregator every time the file changed
+        :rtype: generator of LiveAggregator
+        """
+        last_change = _time.monotonic()
+        while timeout is None or _time.monotonic() - last_change <= timeout:
+            if self.update():
+                last_change = _time.monotonic()
+                yield self.aggregator
+            _time.sleep(interval)
+
+
+if __name__ == '__main__':
+    import sys
+
+    for aggregator in LiveChat(sys.argv[1]).follow():
+        print(aggregator.from_command(Result.author))
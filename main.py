@@ -1,12 +1,21 @@
 # Default libraries
+import datetime
 from re import findall
 from itertools import chain
+from collections import Counter
+import numpy as np
 import pandas as pd
 
 # Project files
+from cache import enable_result_cache, memoize
 from constants import *
+from conversations import *
 from message import *
+from profiling import count_items, profile
+from search import *
+from sketch import *
 from visualisation import *
+from word_index import *
 
 
 class ChatData:
@@ -27,7 +36,7 @@ class ChatData:
                 if isinstance(chats, Chat):
                     authors = chats.authors
                 else:
-                    authors = list(set((author for author in chat.authors) for chat in chats))
+                    authors = sorted(set(chain(*(chat.authors for chat in chats))))
                 return authors, lambda msg: msg.author
             case Result.date:
                 if isinstance(chats, Chat):
@@ -43,6 +52,119 @@ class ChatData:
                 return years, lambda msg: msg.datetime.year
 
     @staticmethod
+    def _get_columns(chat):
+        """
+        :type chat: Chat or MessageColumns or list of Message
+        :rtype: MessageColumns
+        """
+        if isinstance(chat, Chat):
+            return chat.columns
+        if isinstance(chat, MessageColumns):
+            return chat
+        return MessageColumns.from_messages(chat)
+
+    @staticmethod
+    def _is_columnar(chat):
+        return isinstance(chat, MessageColumns) or isinstance(chat, Chat) and chat.is_columnar
+
+    @staticmethod
+    def _get_word_lists(chat):
+        """Words of every message, taken from the cache of the columns or of every Message
+
+        :type chat: Chat or MessageColumns or list of Message
+        :rtype: list of list of str
+        """
+        if ChatData._is_columnar(chat):
+            return ChatData._get_columns(chat).get_word_lists()
+        return list(message.get_words() for message in chat)
+
+    @staticmethod
+    def _get_contents(chat):
+        """Content of every message, decoded straight from the columns without creating a Message per row
+
+        :type chat: Chat or MessageColumns or list of Message
+        :rtype: list of str
+        """
+        if ChatData._is_columnar(chat):
+            return list(ChatData._get_columns(chat).contents())
+        return list(message.content for message in chat)
+
+    @staticmethod
+    def _get_lower_contents(chat):
+        """Lowercase content of every message, taken from the cache of the columns or of every Message
+
+        :type chat: Chat or MessageColumns or list of Message
+        :rtype: list of str
+        """
+        if ChatData._is_columnar(chat):
+            return ChatData._get_columns(chat).get_lower_contents()
+        return list(message.lower for message in chat)
+
+    @staticmethod
+    def _get_timestamps(chat):
+        """Timestamp of every message, a list of Message only gets this one column and it isn't kept
+
+        :type chat: Chat or MessageColumns or list of Message
+        :rtype: np.ndarray
+        """
+        if ChatData._is_columnar(chat):
+            return ChatData._get_columns(chat).timestamps
+        return np.fromiter((message.timestamp for message in chat), dtype=np.int64, count=len(chat))
+
+    @staticmethod
+    def _get_author_codes(chat):
+        """Author of every message as a code, a list of Message only gets this one column and it isn't kept
+
+        :type chat: Chat or MessageColumns or list of Message
+        :return: code of every message and the lookup table with the author names
+        :rtype: (np.ndarray, list of str)
+        """
+        if ChatData._is_columnar(chat):
+            columns = ChatData._get_columns(chat)
+            return columns.author_codes, columns.authors
+        authors = dict()
+        codes = np.fromiter((authors.setdefault(message.author, len(authors)) for message in chat), dtype=np.int64,
+                            count=len(chat))
+        return codes, list(authors)
+
+    @staticmethod
+    def _bucket_keys(chat, data_type, index):
+        """Position in the index of every message at once, the vectorized counterpart of _parameters
+
+        :type chat: Chat or MessageColumns or list of Message
+        :type data_type: str
+        :param index: index returned by _parameters for the same data type
+        :type index: Any
+        :rtype: np.ndarray
+        """
+        if data_type == Result.author:
+            author_codes, authors = ChatData._get_author_codes(chat)
+            positions = {author: i for i, author in enumerate(index)}
+            lookup = np.array(list(positions.get(author, -1) for author in authors), dtype=np.int64)
+            return lookup[author_codes]
+        timestamps = ChatData._get_timestamps(chat)
+        match data_type:
+            case Result.minute:
+                return timestamps % 86400 // 60
+            case Result.hour:
+                return timestamps % 86400 // 3600
+        return get_day_keys(timestamps // 86400, data_type, index)
+
+    @staticmethod
+    def _histogram(chat, data_type, index):
+        """Count the messages per index value with one bincount, messages outside the index are ignored
+
+        :type chat: Chat or MessageColumns or list of Message
+        :type data_type: str
+        :type index: Any
+        :rtype: np.ndarray
+        """
+        keys = ChatData._bucket_keys(chat, data_type, index)
+        keys = keys[(keys >= 0) & (keys < len(index))]
+        return np.bincount(keys, minlength=len(index))
+
+    @staticmethod
+    @profile(Stage.aggregate, count_items)
     def from_chat(chat, index, column, get_index_function, data=0):
         """
         :type chat: Chat or list of Message
@@ -53,43 +175,107 @@ class ChatData:
         :rtype: pd.DataFrame
         """
         results = pd.DataFrame(index=index, columns=[column], data=data)
-        for message in chat:
-            results.loc[get_index_function(message)][column] += 1
+        counts = Counter(map(get_index_function, chat))
+        results[column] += list(counts[key] for key in results.index)
         return results
 
     @staticmethod
+    @profile(Stage.aggregate, count_items)
     def from_chats(chats, index, columns, get_index_function, data=0):
         results = pd.DataFrame(index=index, columns=columns, data=data)
         for chat, column in zip(chats, columns):
-            for message in chat:
-                results[column][get_index_function(message)] += 1
+            counts = Counter(map(get_index_function, chat))
+            results[column] += list(counts[key] for key in results.index)
         return results
 
     @staticmethod
+    @profile(Stage.aggregate, count_items)
+    @memoize
     def from_command_chat(chat, data_type, column="Messages"):
-        index, get_index_function = ChatData._parameters(chat, data_type)
-        return ChatData.from_chat(chat, index, column, get_index_function)
+        index = ChatData._parameters(chat, data_type)[0]
+        return pd.DataFrame(index=index, columns=[column], data=ChatData._histogram(chat, data_type, index))
 
     @staticmethod
+    @profile(Stage.aggregate, count_items)
+    @memoize
     def from_command_chats(chats, data_type, columns=None):
-        index, get_index_function = ChatData._parameters(chats, data_type)
+        index = ChatData._parameters(chats, data_type)[0]
         if columns is None:
             columns = list(f"Messages {i+1}" for i in range(len(chats)))
-        return ChatData.from_chats(chats, index, columns, get_index_function)
+        data = np.column_stack(list(ChatData._histogram(chat, data_type, index) for chat in chats))
+        return pd.DataFrame(index=index, columns=columns, data=data)
 
     @staticmethod
-    def message_lengths(chat):
+    @profile(Stage.aggregate, count_items)
+    @memoize
+    def aggregate(chat, statistics=Result.statistics, max_interval=max_cluster_time_interval, by_author=False):
+        """Compute many statistics in one vectorized sweep over the columns of the chat
+
+        :type chat: Chat
+        :param statistics: types from Result.statistics
+        :type statistics: list of str
+        :param max_interval: maximum amount of minutes between messages before a new cluster is created
+        :type max_interval: int
+        :param by_author: break message lengths and letters down per author
+        :type by_author: bool
+        :return: the same result per statistic as from_command_chat, message_lengths, chat_starters, chat_enders,
+            letters and count_media return
+        :rtype: dict of str to pd.DataFrame or int
+        """
+        columns = ChatData._get_columns(chat)
+        author_codes = columns.recode(chat.authors) if by_author else None
+        conversations = None
+        results = dict()
+        for statistic in statistics:
+            match statistic:
+                case Result.lengths:
+                    data = np.column_stack((columns.word_counts(), columns.lengths()))
+                    if by_author:
+                        valid = author_codes >= 0
+                        data = np.column_stack([np.bincount(author_codes[valid], minlength=len(chat.authors))] +
+                                               list(np.bincount(author_codes[valid], weights=lengths[valid],
+                                                                minlength=len(chat.authors)).astype(np.int64)
+                                                    for lengths in data.T))
+                        results[statistic] = pd.DataFrame(index=chat.authors, data=data,
+                                                          columns=["Messages", "Length (words)",
+                                                                   "Length (characters)"])
+                    else:
+                        results[statistic] = pd.DataFrame(index=range(len(columns)), data=data,
+                                                          columns=["Length (words)", "Length (characters)"])
+                case Result.starters | Result.enders:
+                    if conversations is None:
+                        conversations = Conversations(columns, chat.authors, max_interval)
+                    column = "Chats started" if statistic == Result.starters else "Chats ended"
+                    results[statistic] = conversations.get_author_statistics()[[column]]
+                case Result.letters:
+                    if by_author:
+                        counts = columns.letter_counts(author_codes, len(chat.authors))
+                        results[statistic] = pd.DataFrame(index=alphabet_array, columns=chat.authors, data=counts.T)
+                    else:
+                        results[statistic] = pd.DataFrame(index=alphabet_array, columns=["Frequency"],
+                                                          data=columns.letter_counts())
+                case Result.media:
+                    results[statistic] = int(np.count_nonzero(columns.media))
+                case _:
+                    index = ChatData._parameters(chat, statistic)[0]
+                    results[statistic] = pd.DataFrame(index=index, columns=["Messages"],
+                                                      data=ChatData._histogram(columns, statistic, index))
+        return results
+
+    @staticmethod
+    @profile(Stage.aggregate, count_items)
+    def message_lengths(chat, by_author=False):
         """
         :type chat: Chat
+        :param by_author: total amount of messages, words and characters per author instead of the lengths of every
+            message
+        :type by_author: bool
         :rtype: pd.DataFrame
         """
-        results = pd.DataFrame(index=range(chat.length), columns=["Length (words)", "Length (characters)"], data=0)
-        for i in range(chat.length):
-            results["Length (words)"][i] = len(chat[i].get_words())
-            results["Length (characters)"][i] = len(chat[i])
-        return results
+        return ChatData.aggregate(chat, [Result.lengths], by_author=by_author)[Result.lengths]
 
     @staticmethod
+    @profile(Stage.aggregate, count_items)
     def chat_starters(chat, max_interval=max_cluster_time_interval):
         """
         :type chat: Chat
@@ -97,23 +283,69 @@ class ChatData:
         :type max_interval: int
         :rtype: pd.DataFrame
         """
-        column = "Chats started"
-        results = pd.DataFrame(index=chat.authors, columns=[column], data=0)
-        results[column][chat[0].author] += 1
+        return ChatData.aggregate(chat, [Result.starters], max_interval)[Result.starters]
 
-        for i in range(1, chat.length):
-            time_interval = (chat[i].datetime - chat[i-1].datetime).total_seconds() / 60
-            if time_interval > max_interval:
-                results[column][chat[i].author] += 1
-        return results
+    @staticmethod
+    @profile(Stage.aggregate, count_items)
+    def chat_enders(chat, max_interval=max_cluster_time_interval):
+        """
+        :type chat: Chat
+        :param max_interval: maximum amount of minutes between messages before a new cluster is created
+        :type max_interval: int
+        :rtype: pd.DataFrame
+        """
+        return ChatData.aggregate(chat, [Result.enders], max_interval)[Result.enders]
+
+    @staticmethod
+    @profile(Stage.aggregate, count_items)
+    @memoize
+    def conversations(chat, max_interval=max_cluster_time_interval):
+        """
+        :type chat: Chat
+        :param max_interval: maximum amount of minutes between messages before a new cluster is created
+        :type max_interval: int
+        :return: start, end, number of messages, duration, participants, starter and ender of every cluster
+        :rtype: pd.DataFrame
+        """
+        return Conversations(ChatData._get_columns(chat), chat.authors, max_interval).get_conversations()
+
+    @staticmethod
+    @profile(Stage.aggregate, count_items)
+    @memoize
+    def response_times(chat, max_interval=max_cluster_time_interval):
+        """
+        :type chat: Chat
+        :param max_interval: maximum amount of minutes between messages before a new cluster is created
+        :type max_interval: int
+        :return: clusters started and ended, replies and mean and median reply time in minutes per author
+        :rtype: pd.DataFrame
+        """
+        return Conversations(ChatData._get_columns(chat), chat.authors, max_interval).get_author_statistics()
+
+    @staticmethod
+    @profile(Stage.aggregate, count_items)
+    def build_word_index(chat):
+        """Index the words of the chat once, word searches, word_timeline and unique_words use it from then on
+
+        :type chat: Chat
+        :rtype: WordIndex
+        """
+        chat.word_index = WordIndex.from_messages(chat)
+        return chat.word_index
 
     @staticmethod
+    @profile(Stage.aggregate, count_items)
+    @memoize
     def unique_words(chat):
-        words = list(chain(*list(message.get_words() for message in chat)))
-        word_index = list(set(words))
-        return ChatData.from_chat(list(words), word_index, "Frequency", lambda word: word)
+        index = getattr(chat, "word_index", None)
+        if index is not None:
+            frequencies = index.frequencies()
+            return pd.DataFrame(index=list(frequencies), columns=["Frequency"], data=list(frequencies.values()))
+        frequencies = Counter(chain.from_iterable(ChatData._get_word_lists(chat)))
+        return pd.DataFrame(index=list(frequencies), columns=["Frequency"], data=list(frequencies.values()))
 
     @staticmethod
+    @profile(Stage.aggregate, count_items)
     def filter_unique_words(results, min_length=min_word_frequency_length):
         frequencies = results.to_dict()["Frequency"]
         for word in list(frequencies.keys()):
@@ -122,15 +354,46 @@ class ChatData:
         return frequencies
 
     @staticmethod
-    def letters(chat):
-        results = pd.DataFrame(index=alphabet_array, columns=["Frequency"], data=0)
-        for message in chat:
-            for character in message.content.lower():
-                if character in alphabet:
-                    results["Frequency"][character] += 1
-        return results
+    @profile(Stage.aggregate, count_items)
+    @memoize
+    def top_words(chat, top=vocabulary_top, by_author=False, memory_budget=vocabulary_memory, error=sketch_error,
+                  probability=sketch_failure_probability):
+        """Most frequent words for word_cloud, filtered like filter_unique_words and counted within a memory budget
+
+        :type chat: Chat
+        :param top: amount of words
+        :type top: int
+        :param by_author: the top words of every author instead of the whole chat
+        :type by_author: bool
+        :param memory_budget: bytes the word counts may take, beyond it the counts are approximate
+        :type memory_budget: int
+        :param error: maximum overestimate of approximate counts as a fraction of all counted words
+        :type error: float
+        :param probability: probability an approximate count is off by more than the error
+        :type probability: float
+        :return: words and their counts, per author when by author
+        :rtype: dict of str to int or dict of str to dict of str to int
+        """
+        kwargs = dict(top=top, error=error, probability=probability, filter_words=True)
+        if by_author:
+            return {author: counter.frequencies()
+                    for author, counter in count_words_per_author(chat, memory_budget, **kwargs).items()}
+        return count_words(chat, memory_budget=memory_budget, **kwargs).frequencies()
 
     @staticmethod
+    @profile(Stage.aggregate, count_items)
+    def letters(chat, by_author=False):
+        """
+        :type chat: Chat
+        :param by_author: a frequency column per author instead of one for the whole chat
+        :type by_author: bool
+        :rtype: pd.DataFrame
+        """
+        return ChatData.aggregate(chat, [Result.letters], by_author=by_author)[Result.letters]
+
+    @staticmethod
+    @profile(Stage.aggregate, count_items)
+    @memoize
     def search(chat, pattern, match_case=False, words=False, regex=False):
         """
         :type chat: Chat or list of Message
@@ -144,18 +407,27 @@ class ChatData:
         :return: number of occurrences of search
         :rtype: int
         """
-        if match_case:
-            texts = list(message.content for message in chat)
-        else:
+        index = getattr(chat, "word_index", None)
+        if index is not None and words and not match_case and not regex:
+            return index.count(pattern.lower())
+        if not match_case:
             pattern = pattern.lower()
-            texts = list(message.content.lower() for message in chat)
+        if words and not regex:
+            if match_case:
+                texts = list(map(get_words, ChatData._get_contents(chat)))
+            else:
+                texts = ChatData._get_word_lists(chat)
+        elif match_case:
+            texts = ChatData._get_contents(chat)
+        else:
+            texts = ChatData._get_lower_contents(chat)
         if regex:
             return sum(len(findall(pattern, text)) for text in texts)
-        if words:
-            texts = list(get_words(text) for text in texts)
         return sum(text.count(pattern) for text in texts)
 
     @staticmethod
+    @profile(Stage.aggregate, count_items)
+    @memoize
     def search_list(chat, pattern_list, match_case=False, words=False, regex=False):
         """
         :type chat: Chat or list of Message
@@ -177,11 +449,14 @@ class ChatData:
         if type(regex) is bool:
             regex = [regex] * searches
 
-        search_data = list(ChatData.search(chat, pattern_list[i], match_case[i], words[i], regex[i]) for i in
-                           range(searches))
+        search_data = MultiSearch(pattern_list, match_case, words, regex).count(
+            lambda: ChatData._get_contents(chat), lambda: ChatData._get_lower_contents(chat),
+            lambda: ChatData._get_word_lists(chat))
         return pd.DataFrame(index=pattern_list, columns=["Frequency"], data=search_data)
 
     @staticmethod
+    @profile(Stage.aggregate, count_items)
+    @memoize
     def word_timeline(chat, word):
         """
         :type chat: Chat
@@ -190,24 +465,39 @@ class ChatData:
         """
         word = word.lower()
         dates = chat.get_date_range()
-        results = pd.DataFrame(index=dates, columns=["Frequency"], data=0)
+        index = chat.word_index
+        if index is not None:
+            positions, counts = index.postings(word)
+            days = chat.columns.timestamps[positions] // 86400 - (chat.start_date - datetime.date(1970, 1, 1)).days
+            frequencies = np.bincount(days, weights=counts, minlength=len(dates)).astype(np.int64)
+            return pd.DataFrame(index=dates, columns=["Frequency"], data=frequencies)
 
+        if chat.is_columnar:
+            counts = np.fromiter((words.count(word) for words in chat.columns.get_word_lists()), dtype=np.int64,
+                                 count=len(chat))
+            days = chat.columns.timestamps // 86400 - (chat.start_date - datetime.date(1970, 1, 1)).days
+            frequencies = np.bincount(days, weights=counts, minlength=len(dates)).astype(np.int64)
+            return pd.DataFrame(index=dates, columns=["Frequency"], data=frequencies)
+
+        frequencies = Counter()
         for message in chat:
-            results["Frequency"][message.datetime.date()] += message.get_words().count(word)
-        return results
+            frequencies[message.datetime.date()] += message.get_words().count(word)
+        return pd.DataFrame(index=dates, columns=["Frequency"], data=list(frequencies[date] for date in dates))
 
     @staticmethod
+    @profile(Stage.aggregate, count_items)
     def count_media(chat):
-        return sum(message.media for message in chat)
+        return ChatData.aggregate(chat, [Result.media])[Result.media]
 
 
 def main():
+    enable_result_cache()
     chat = Chat.from_file("Chat 4B.txt")
 
     data_date = ChatData.from_command_chat(chat, Result.date)
     figure = get_figure_date(data_date)[0]
     figure.savefig("fig1.pdf")
-    plt.show()
+    show()
 
     data_hour = ChatData.from_command_chat(chat, Result.hour)
     figure = get_figure_days(data_hour)[0]
@@ -22,6 +22,10 @@ def get_choice_from_list(choices, message):
     return choices[index]
 
 
+def get_chat_filenames():
+    return sorted(file for file in listdir(Directory.folder_chats) if file.endswith(".txt"))
+
+
 def get_chat_filename():
-    files = list(file for file in listdir(Directory.folder_chats) if file.endswith(".txt"))
+    files = get_chat_filenames()
     return get_choice_from_list(files, "Choose one of the chat files by its index:")
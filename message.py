@@ -1,7 +1,40 @@
 import datetime as _datetime
+import hashlib as _hashlib
 import re as _re
+import bisect as _bisect
+import itertools as _itertools
+import sys as _sys
 
-from constants import Directory, Filter, Format, punctuation
+import numpy as _np
+
+from constants import Date, Directory, Filter, Format, Result, Stage, alphabet, format_detection_lines, \
+    mapped_batch_size, punctuation
+import profiling as _profiling
+
+_epoch = _datetime.datetime(1970, 1, 1)
+_second = _datetime.timedelta(seconds=1)
+_parsers = dict()
+
+# Code of the letter of the alphabet every byte is after lowercasing ASCII, bytes of other characters get len(alphabet)
+_letter_codes = _np.full(256, len(alphabet), dtype=_np.uint8)
+_letter_codes[_np.frombuffer(alphabet.encode("ascii"), dtype=_np.uint8)] = _np.arange(len(alphabet))
+_letter_codes[_np.frombuffer(alphabet.upper().encode("ascii"), dtype=_np.uint8)] = _np.arange(len(alphabet))
+# The only characters outside ASCII that str.lower turns into letters of the alphabet
+_special_letters = {character: "".join(letter for letter in character.lower() if letter in alphabet)
+                    for character in ("\u0130", "\u212a")}
+
+
+def _get_fingerprint(parts):
+    """
+    :param parts: bytes or objects supporting the buffer protocol, like NumPy arrays
+    :type parts: Iterable
+    :return: hash of all parts, the same in every process
+    :rtype: str
+    """
+    fingerprint = _hashlib.blake2b(digest_size=16)
+    for part in parts:
+        fingerprint.update(part)
+    return fingerprint.hexdigest()
 
 
 def get_chat_file_content(filename):
@@ -9,10 +42,59 @@ def get_chat_file_content(filename):
         return file.read()
 
 
+def read_chat_file(filename):
+    """Read a chat file located in the folder specified in constants one line at a time
+
+    :return: lines of the chat file, without line endings
+    :rtype: generator of str
+    """
+    with open(f"{Directory.folder_chats}/{filename}", "r", encoding="utf-8") as file:
+        for line in file:
+            yield line.rstrip("\n")
+
+
+def detect_date_format(lines):
+    """Detect the date format from the lines that start with a message in a sample of the chat
+
+    :param lines: first lines of the chat
+    :type lines: Iterable of str
+    :return: the date format most lines start with, None if no line starts with a date
+    :rtype: str or None
+    """
+    matches = dict.fromkeys(Format.all_dates, 0)
+    for line in lines:
+        for date_format in Format.all_dates:
+            if get_parser(date_format).match(line):
+                matches[date_format] += 1
+    date_format = max(Format.all_dates, key=lambda date_format: matches[date_format])
+    return date_format if matches[date_format] > 0 else None
+
+
 def get_date_format(content):
-    for date_format in Format.regex_dates:
-        if _re.match(Format.regex_dates[date_format], content[:10]):
-            return date_format
+    return detect_date_format(content.split("\n", format_detection_lines)[:format_detection_lines])
+
+
+def iter_messages(lines, date_format):
+    """Group chat lines into messages, where lines that don't start with a date continue the previous message
+
+    :param lines: lines of the chat text
+    :type lines: Iterable of str
+    :param date_format: DD-MM-YYYY or MM/DD/YY or DD-MM-YY
+    :type date_format: str
+    :return: full content of every message, continuation lines joined with a space
+    :rtype: generator of str
+    """
+    match = get_parser(date_format).match
+    parts = None
+    for line in lines:
+        if match(line):
+            if parts is not None:
+                yield " ".join(parts)
+            parts = [line]
+        elif parts is not None:
+            parts.append(line)
+    if parts is not None:
+        yield " ".join(parts)
 
 
 def separate_messages(content, date_format):
@@ -25,16 +107,38 @@ def separate_messages(content, date_format):
     :return: all chat messages separated
     :rtype: list of str
     """
-    messages_1 = content.split("\n")
-    messages_2 = list()
-    date_pattern = f"^({Format.regex_dates[date_format]} {Format.time})"
+    return list(iter_messages(content.split("\n"), date_format))
+
+
+def filter_messages(messages, filter_whatsapp_announcements=True, filter_sentences=True):
+    """Lazily apply the filters of get_message_array
+
+    :type messages: Iterable of Message
+    :type filter_whatsapp_announcements: bool
+    :type filter_sentences: bool
+    :rtype: generator of Message
+    """
+    sentences = set(Filter.sentences) if filter_sentences else set()
+    for message in messages:
+        if filter_whatsapp_announcements and message.author == Filter.announcement:
+            continue
+        if message.content in sentences:
+            if message.content == Filter.sentences[0]:
+                message.media = True
+            message.content = ""
+        yield message
 
-    for message in messages_1:
-        if _re.match(date_pattern, message):
-            messages_2.append(message)
-        elif len(messages_2) > 0:
-            messages_2[-1] += " " + message
-    return messages_2
+
+def convert_messages(messages, conversion_function, filter_whatsapp_announcements=True, filter_sentences=True):
+    """Lazily convert message strings into Message objects, see get_message_array
+
+    :type messages: Iterable of str
+    :type conversion_function: function
+    :type filter_whatsapp_announcements: bool
+    :type filter_sentences: bool
+    :rtype: generator of Message
+    """
+    return filter_messages(map(conversion_function, messages), filter_whatsapp_announcements, filter_sentences)
 
 
 def get_message_array(messages, conversion_function, filter_whatsapp_announcements=True, filter_sentences=True):
@@ -50,16 +154,7 @@ def get_message_array(messages, conversion_function, filter_whatsapp_announcemen
     :type filter_sentences: bool
     :rtype: list of Message
     """
-    messages = list(conversion_function(message) for message in messages)
-    if filter_whatsapp_announcements:
-        messages = list(message for message in messages if message.author != Filter.announcement)
-    if filter_sentences:
-        for message in messages:
-            if message.content in Filter.sentences:
-                if message.content == Filter.sentences[0]:
-                    message.media = True
-                message.content = ""
-    return messages
+    return list(convert_messages(messages, conversion_function, filter_whatsapp_announcements, filter_sentences))
 
 
 def get_words(text):
@@ -74,6 +169,23 @@ def get_words(text):
     return list(word for word in text_blocks if word.isalpha())
 
 
+def to_timestamp(date_time):
+    """Convert a naive datetime into whole seconds since the Unix epoch
+
+    :type date_time: datetime.datetime
+    :rtype: int
+    """
+    return (date_time - _epoch) // _second
+
+
+def from_timestamp(timestamp):
+    """
+    :type timestamp: int
+    :rtype: datetime.datetime
+    """
+    return _epoch + _datetime.timedelta(seconds=int(timestamp))
+
+
 def get_date_extremes(chats):
     min_date = min(chat.start_date for chat in chats)
     max_date = max(chat.end_date for chat in chats)
@@ -99,20 +211,137 @@ def get_year_range(min_date, max_date):
     return range(min_date.year, max_date.year + 1)
 
 
+def get_day_index(data_type, min_date, max_date):
+    """
+    :param data_type: one of Result.all based on the date
+    :type data_type: str
+    :type min_date: datetime.date
+    :type max_date: datetime.date
+    :return: index like ChatData._parameters gives it for messages between the dates
+    :rtype: Any
+    """
+    match data_type:
+        case Result.day:
+            return Date.weekdays
+        case Result.month:
+            return Date.months
+        case Result.date:
+            return get_date_range(min_date, max_date)
+        case Result.year:
+            return get_year_range(min_date, max_date)
+    raise ValueError(f"Unknown data type {data_type}")
+
+
+def get_day_keys(days, data_type, index):
+    """Position in the index of every day at once, shared by everything that counts messages per day
+
+    :param days: days since the Unix epoch
+    :type days: np.ndarray
+    :param data_type: one of Result.all based on the date
+    :type data_type: str
+    :param index: index returned by get_day_index or ChatData._parameters for the same data type
+    :type index: Any
+    :return: positions, outside the index for days it doesn't contain
+    :rtype: np.ndarray
+    """
+    match data_type:
+        case Result.day:
+            # 1 January 1970 was a Thursday
+            return (days + 3) % 7
+        case Result.month:
+            return days.astype("datetime64[D]").astype("datetime64[M]").astype(_np.int64) % 12
+        case Result.date:
+            return days - (index[0] - _epoch.date()).days
+        case Result.year:
+            return days.astype("datetime64[D]").astype("datetime64[Y]").astype(_np.int64) + 1970 - index[0]
+    raise ValueError(f"Unknown data type {data_type}")
+
+
+def get_day_buckets(days, data_type):
+    """
+    :param days: days since the Unix epoch, at least one
+    :type days: np.ndarray
+    :param data_type: one of Result.all based on the date
+    :type data_type: str
+    :return: index for the dates from the first to the last day and the position of every day in it
+    :rtype: (Any, np.ndarray)
+    """
+    min_date, max_date = (from_timestamp(int(day) * 86400).date() for day in (days.min(), days.max()))
+    index = get_day_index(data_type, min_date, max_date)
+    return index, get_day_keys(days, data_type, index)
+
+
 class Message:
+    __slots__ = ("author", "media", "_content", "_lower", "_words", "_datetime", "_timestamp")
+
     def __init__(self, date_time, author, content):
         """
         :type date_time: datetime.datetime
         :type author: str
         :type content: str
         """
-        self.author = author
+        self.author = _sys.intern(author)
         self.content = content
         self.datetime = date_time
         self.media = False
 
+    @property
+    def datetime(self):
+        """Time the message was sent, created from the timestamp the first time it's needed
+
+        :rtype: datetime.datetime
+        """
+        if self._datetime is None:
+            self._datetime = from_timestamp(self._timestamp)
+        return self._datetime
+
+    @datetime.setter
+    def datetime(self, date_time):
+        self._datetime = date_time
+        self._timestamp = None
+
+    @property
+    def timestamp(self):
+        """
+        :return: seconds since the Unix epoch
+        :rtype: int
+        """
+        if self._timestamp is None:
+            self._timestamp = to_timestamp(self._datetime)
+        return self._timestamp
+
+    @property
+    def content(self):
+        return self._content
+
+    @content.setter
+    def content(self, content):
+        self._content = content
+        self._lower = None
+        self._words = None
+
+    @property
+    def lower(self):
+        """Lowercase content, computed once until the content changes
+
+        :rtype: str
+        """
+        if self._lower is None:
+            self._lower = self._content.lower()
+        return self._lower
+
     def get_words(self):
-        return get_words(self.content.lower())
+        """Words of the lowercase content, computed once until the content changes, the list should not be modified
+
+        :rtype: list of str
+        """
+        if self._words is None:
+            self._words = get_words(self.lower)
+        return self._words
+
+    @property
+    def word_count(self):
+        return len(self.get_words())
 
     def __str__(self):
         return f"{self.datetime.isoformat(sep=' ', timespec='minutes')} - {self.author}: {self.content}"
@@ -127,6 +356,20 @@ class Message:
     def empty():
         return Message(_datetime.datetime.min, "Author", "Content")
 
+    @staticmethod
+    def with_timestamp(timestamp, author, content):
+        """Create a message that only creates its datetime when it's needed
+
+        :param timestamp: seconds since the Unix epoch
+        :type timestamp: int
+        :type author: str
+        :type content: str
+        :rtype: Message
+        """
+        message = Message(None, author, content)
+        message._timestamp = timestamp
+        return message
+
     @staticmethod
     def announcement(date_time, content):
         """When a message has no author, it's sent by Whatsapp and gets a default author name assigned
@@ -144,20 +387,7 @@ class Message:
         :type message: str
         :rtype: Message
         """
-        author_index = message.find(":", 19)
-
-        date = message[:10].split("-")
-        date_time = _datetime.datetime(int(date[2]),
-                                       int(date[1]),
-                                       int(date[0]),
-                                       int(message[11:13]),
-                                       int(message[14:16]))
-
-        if author_index == -1:
-            return Message.announcement(date_time, message[19:])
-        author = message[19:author_index]
-        content = message[author_index + 2:]
-        return Message(date_time, author, content)
+        return get_parser(Format.date_1).parse(message)
 
     @staticmethod
     def date_format_2(message):
@@ -166,21 +396,7 @@ class Message:
         :type message: str
         :rtype: Message
         """
-        date_index = message.find(",")
-        author_index = message.find(":", date_index + 10)
-
-        date = message[:date_index].split("/")
-        date_time = _datetime.datetime(int(date[2]) + 2000,
-                                       int(date[0]),
-                                       int(date[1]),
-                                       int(message[date_index + 2:date_index + 4]),
-                                       int(message[date_index + 5:date_index + 7]))
-
-        if author_index == -1:
-            return Message.announcement(date_time, message[date_index + 10:])
-        author = message[date_index + 10:author_index]
-        content = message[author_index + 2:]
-        return Message(date_time, author, content)
+        return get_parser(Format.date_2).parse(message)
 
     @staticmethod
     def date_format_3(message):
@@ -189,20 +405,7 @@ class Message:
         :type message: str
         :rtype: Message
         """
-        author_index = message.find(":", 18)
-
-        date = message[:8].split("-")
-        date_time = _datetime.datetime(int(date[2]) + 2000,
-                                       int(date[1]),
-                                       int(date[0]),
-                                       int(message[10:12]),
-                                       int(message[13:15]))
-
-        if author_index == -1:
-            return Message.announcement(date_time, message[18:])
-        author = message[18:author_index]
-        content = message[author_index + 2:]
-        return Message(date_time, author, content)
+        return get_parser(Format.date_3).parse(message)
 
     @staticmethod
     def get_conversion_function(date_format):
@@ -215,10 +418,752 @@ class Message:
                 return Message.date_format_3
 
 
+class MessageParser:
+    def __init__(self, date_format):
+        """Parser that reads the date, time, author and content of messages with one precompiled pattern
+
+        :param date_format: DD-MM-YYYY or MM/DD/YY or DD-MM-YY
+        :type date_format: str
+        """
+        self.date_format = date_format
+        self.pattern = _re.compile(Format.regex_messages[date_format])
+        self.match = self.pattern.match
+        self.year_offset = Format.year_offsets[date_format]
+
+    def get_timestamp(self, match):
+        """
+        :param match: match of the pattern at the start of a message
+        :type match: re.Match
+        :return: seconds since the Unix epoch
+        :rtype: int
+        """
+        return self.get_date(match) + self.get_time(match)
+
+    def get_date(self, match):
+        """
+        :type match: re.Match
+        :return: timestamp of the start of the day the message was sent on
+        :rtype: int
+        """
+        year, month, day = map(int, match.group("year", "month", "day"))
+        return to_timestamp(_datetime.datetime(year + self.year_offset, month, day))
+
+    @staticmethod
+    def get_time(match):
+        """
+        :type match: re.Match
+        :return: seconds since the start of the day the message was sent on
+        :rtype: int
+        """
+        hour, minute = map(int, match.group("hour", "minute"))
+        return hour * 3600 + minute * 60
+
+    @staticmethod
+    def create_message(timestamp, text):
+        """
+        :type timestamp: int
+        :param text: message without the date and time at the start
+        :type text: str
+        :rtype: Message
+        """
+        author_index = text.find(":")
+        if author_index == -1:
+            return Message.with_timestamp(timestamp, Filter.announcement, text)
+        return Message.with_timestamp(timestamp, text[:author_index], text[author_index + 2:])
+
+    def parse(self, message):
+        """Convert one message from str format to Message format
+
+        :type message: str
+        :rtype: Message
+        """
+        match = self.match(message)
+        return self.create_message(self.get_timestamp(match), message[match.end():])
+
+    def parse_lines(self, lines):
+        """Group chat lines into messages and convert them in a single pass, see iter_messages
+
+        :param lines: lines of the chat text
+        :type lines: Iterable of str
+        :rtype: generator of Message
+        """
+        match = self.match
+        create_message = self.create_message
+        dates = dict()
+        times = dict()
+        timestamp = None
+        parts = None
+        for line in lines:
+            line_match = match(line)
+            if line_match is None:
+                if parts is not None:
+                    parts.append(line)
+                continue
+
+            if parts is not None:
+                yield create_message(timestamp, parts[0] if len(parts) == 1 else " ".join(parts))
+            # Every distinct date and time of day is only converted once
+            date_key, time_key = line_match.group("date", "time")
+            date = dates.get(date_key)
+            if date is None:
+                date = dates[date_key] = self.get_date(line_match)
+            time = times.get(time_key)
+            if time is None:
+                time = times[time_key] = self.get_time(line_match)
+            timestamp = date + time
+            parts = [line[line_match.end():]]
+        if parts is not None:
+            yield create_message(timestamp, " ".join(parts))
+
+
+def get_parser(date_format):
+    """
+    :param date_format: DD-MM-YYYY or MM/DD/YY or DD-MM-YY
+    :type date_format: str
+    :rtype: MessageParser
+    """
+    if date_format not in _parsers:
+        _parsers[date_format] = MessageParser(date_format)
+    return _parsers[date_format]
+
+
+class MessageColumns:
+    def __init__(self, timestamps, author_codes, authors, buffer, offsets, media):
+        """Column oriented message storage, Message objects are only created when one is requested
+
+        :param timestamps: seconds since the Unix epoch of every message
+        :type timestamps: numpy.ndarray
+        :param author_codes: position of the author of every message in authors
+        :type author_codes: numpy.ndarray
+        :param authors: lookup table with the author names
+        :type authors: list of str
+        :param buffer: UTF-8 encoded contents of all messages joined together
+        :type buffer: bytes
+        :param offsets: start of every message in buffer, followed by the end of the last message
+        :type offsets: numpy.ndarray
+        :type media: numpy.ndarray
+        """
+        self.timestamps = timestamps
+        self.author_codes = author_codes
+        self.authors = authors
+        self.buffer = buffer
+        self.offsets = offsets
+        self.media = media
+
+        self.length = len(timestamps)
+        self._word_lists = None
+        self._lower_contents = None
+        self._lengths = None
+        self._fingerprint = None
+
+    def content(self, index):
+        return self.buffer[self.offsets[index]:self.offsets[index + 1]].decode("utf-8")
+
+    def contents(self):
+        """
+        :return: content of every message, in order
+        :rtype: generator of str
+        """
+        buffer = self.buffer
+        offsets = self.offsets.tolist()
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            yield buffer[start:end].decode("utf-8")
+
+    def iter_contents(self, indices):
+        """
+        :param indices: positions of messages
+        :type indices: numpy.ndarray
+        :return: content of the messages at the positions, in the same order
+        :rtype: generator of str
+        """
+        buffer = self.buffer
+        starts = self.offsets[indices].tolist()
+        ends = self.offsets[indices + 1].tolist()
+        return (buffer[start:end].decode("utf-8") for start, end in zip(starts, ends))
+
+    def lengths(self):
+        """
+        :return: number of characters of every message
+        :rtype: numpy.ndarray
+        """
+        if self._lengths is None:
+            data = _np.frombuffer(self.buffer, dtype=_np.uint8)
+            characters = _np.zeros(len(data) + 1, dtype=_np.int64)
+            _np.cumsum((data & 0xC0) != 0x80, out=characters[1:])
+            self._lengths = characters[self.offsets[1:]] - characters[self.offsets[:-1]]
+        return self._lengths
+
+    def fingerprint(self):
+        """Hash of the messages, cheap to compare and the same for the same messages in every process, computed once
+
+        :rtype: str
+        """
+        if self._fingerprint is None:
+            offsets = self.offsets
+            self._fingerprint = _get_fingerprint((self.timestamps.astype(_np.int64),
+                                                  self.author_codes.astype(_np.int64),
+                                                  "\0".join(self.authors).encode("utf-8"),
+                                                  self.media.astype(_np.uint8),
+                                                  offsets - offsets[0],
+                                                  memoryview(self.buffer)[offsets[0]:offsets[-1]]))
+        return self._fingerprint
+
+    @staticmethod
+    def get_messages_fingerprint(messages):
+        """
+        :type messages: list of Message
+        :return: the fingerprint of from_messages(messages), without keeping the columns or the contents in memory
+        :rtype: str
+        """
+        authors = sorted(set(message.author for message in messages))
+        codes = {author: code for code, author in enumerate(authors)}
+        lengths = _np.fromiter((len(message.content.encode("utf-8")) for message in messages), dtype=_np.int64,
+                               count=len(messages))
+        offsets = _np.zeros(len(messages) + 1, dtype=_np.int64)
+        _np.cumsum(lengths, out=offsets[1:])
+        return _get_fingerprint(_itertools.chain(
+            (_np.fromiter((message.timestamp for message in messages), dtype=_np.int64, count=len(messages)),
+             _np.fromiter((codes[message.author] for message in messages), dtype=_np.int64, count=len(messages)),
+             "\0".join(authors).encode("utf-8"),
+             _np.fromiter((message.media for message in messages), dtype=_np.uint8, count=len(messages)),
+             offsets),
+            (message.content.encode("utf-8") for message in messages)))
+
+    def message(self, index):
+        """
+        :type index: int
+        :rtype: Message
+        """
+        message = Message.with_timestamp(int(self.timestamps[index]),
+                                         self.authors[self.author_codes[index]],
+                                         self.content(index))
+        message.media = bool(self.media[index])
+        if self._lower_contents is not None:
+            message._lower = self._lower_contents[index]
+        if self._word_lists is not None:
+            message._words = self._word_lists[index]
+        return message
+
+    def get_lower_contents(self):
+        """Lowercase content of every message like Message.lower returns it, computed once
+
+        :rtype: list of str
+        """
+        if self._lower_contents is None:
+            self._lower_contents = list(content.lower() for content in self.contents())
+        return self._lower_contents
+
+    def get_word_lists(self):
+        """Words of every message like Message.get_words returns them, computed once
+
+        :rtype: list of list of str
+        """
+        if self._word_lists is None:
+            lower_contents = self._lower_contents if self._lower_contents is not None else \
+                (content.lower() for content in self.contents())
+            self._word_lists = list(map(get_words, lower_contents))
+        return self._word_lists
+
+    def word_counts(self):
+        """
+        :return: number of words of every message
+        :rtype: numpy.ndarray
+        """
+        return _np.fromiter(map(len, self.get_word_lists()), dtype=_np.int64, count=self.length)
+
+    def letter_counts(self, author_codes=None, authors=0):
+        """How often every letter of the alphabet occurs in the lowercase content, counted over the whole buffer at once
+
+        :param author_codes: code of the author of every message to count per author, negative codes are skipped
+        :type author_codes: None or numpy.ndarray
+        :param authors: amount of author codes
+        :type authors: int
+        :return: count of every letter of the alphabet, per author code when author codes are given
+        :rtype: numpy.ndarray
+        """
+        data = _letter_codes[_np.frombuffer(self.buffer, dtype=_np.uint8)]
+        specials = list()
+        for character, letters in _special_letters.items():
+            encoded = character.encode("utf-8")
+            if encoded in self.buffer:
+                positions = list(match.start() for match in _re.finditer(_re.escape(encoded), self.buffer))
+                specials.append((letters, _np.array(positions, dtype=_np.int64)))
+        if author_codes is None:
+            counts = _np.bincount(data, minlength=len(alphabet) + 1)[:-1]
+            for letters, positions in specials:
+                for letter in letters:
+                    counts[alphabet.index(letter)] += len(positions)
+            return counts
+
+        positions = _np.flatnonzero(data < len(alphabet))
+        codes = author_codes[_np.searchsorted(self.offsets, positions, side="right") - 1]
+        keys = codes.astype(_np.int64) * len(alphabet) + data[positions]
+        counts = _np.bincount(keys[codes >= 0], minlength=authors * len(alphabet)).reshape(authors, len(alphabet))
+        for letters, positions in specials:
+            codes = author_codes[_np.searchsorted(self.offsets, positions, side="right") - 1]
+            for letter in letters:
+                _np.add.at(counts, (codes[codes >= 0], alphabet.index(letter)), 1)
+        return counts
+
+    def take(self, indices):
+        """Create new columns with only the messages at the specified positions, in the specified order
+
+        :type indices: numpy.ndarray or list of int
+        :rtype: MessageColumns
+        """
+        indices = _np.asarray(indices, dtype=_np.int64)
+        starts = self.offsets[indices].tolist()
+        ends = self.offsets[indices + 1].tolist()
+        buffer = self.buffer
+        offsets = _np.zeros(len(indices) + 1, dtype=_np.int64)
+        _np.cumsum(self.offsets[indices + 1] - self.offsets[indices], out=offsets[1:])
+        return MessageColumns(self.timestamps[indices],
+                              self.author_codes[indices],
+                              self.authors,
+                              b"".join(buffer[start:end] for start, end in zip(starts, ends)),
+                              offsets,
+                              self.media[indices])
+
+    def sort(self):
+        """
+        :return: these columns when they're already sorted by time, otherwise a sorted copy
+        :rtype: MessageColumns
+        """
+        if _np.any(self.timestamps[1:] < self.timestamps[:-1]):
+            return self.take(_np.argsort(self.timestamps, kind="stable"))
+        return self
+
+    def select(self, mask):
+        """
+        :type mask: numpy.ndarray of bool
+        :rtype: MessageColumns
+        """
+        return self.take(_np.flatnonzero(mask))
+
+    def view(self, rows):
+        """
+        :param rows: positions of the messages to select, a slice without step or an array
+        :type rows: slice or numpy.ndarray
+        :return: the selected messages without copying them
+        :rtype: MessageView
+        """
+        return MessageView(self, rows)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return self.take(_np.arange(self.length)[item])
+        if item < 0:
+            item += self.length
+        if not 0 <= item < self.length:
+            raise IndexError("message index out of range")
+        return self.message(item)
+
+    def __iter__(self):
+        return (self.message(i) for i in range(self.length))
+
+    def recode(self, authors):
+        """
+        :param authors: new lookup table, authors missing from it get code -1
+        :type authors: list of str
+        :return: author codes of every message into the new lookup table
+        :rtype: numpy.ndarray
+        """
+        positions = {author: code for code, author in enumerate(authors)}
+        lookup = _np.array(list(positions.get(author, -1) for author in self.authors), dtype=_np.int32)
+        return lookup[self.author_codes] if len(lookup) > 0 else self.author_codes.astype(_np.int32)
+
+    def to_arrays(self):
+        """
+        :return: all columns as NumPy arrays, like stored by ChatCache
+        :rtype: dict of str to numpy.ndarray
+        """
+        return dict(timestamps=self.timestamps,
+                    author_codes=self.author_codes,
+                    authors=_np.array(self.authors, dtype=str),
+                    buffer=_np.frombuffer(self.buffer, dtype=_np.uint8),
+                    offsets=self.offsets,
+                    media=self.media)
+
+    @staticmethod
+    def from_arrays(arrays):
+        """
+        :type arrays: dict of str to numpy.ndarray
+        :rtype: MessageColumns
+        """
+        return MessageColumns(arrays["timestamps"],
+                              arrays["author_codes"],
+                              arrays["authors"].tolist(),
+                              arrays["buffer"].tobytes(),
+                              arrays["offsets"],
+                              arrays["media"])
+
+    @staticmethod
+    def concatenate(columns_list):
+        """
+        :param columns_list: columns to join in the specified order
+        :type columns_list: list of MessageColumns
+        :rtype: MessageColumns
+        """
+        authors = sorted(set(_itertools.chain(*(columns.authors for columns in columns_list))))
+        offsets = _np.zeros(sum(len(columns) for columns in columns_list) + 1, dtype=_np.int64)
+        start = 0
+        size = 0
+        for columns in columns_list:
+            offsets[start + 1:start + len(columns) + 1] = columns.offsets[1:] - columns.offsets[0] + size
+            start += len(columns)
+            size += int(columns.offsets[-1] - columns.offsets[0])
+        return MessageColumns(_np.concatenate([columns.timestamps for columns in columns_list]),
+                              _np.concatenate([columns.recode(authors) for columns in columns_list]),
+                              authors,
+                              b"".join(columns.buffer[columns.offsets[0]:columns.offsets[-1]]
+                                       for columns in columns_list),
+                              offsets,
+                              _np.concatenate([columns.media for columns in columns_list]))
+
+    @staticmethod
+    def merge(left, right):
+        """Merge two sorted columns into sorted columns without sorting them again, messages sent at the same time
+        keep the messages of left first
+
+        :type left: MessageColumns
+        :type right: MessageColumns
+        :rtype: MessageColumns
+        """
+        columns = MessageColumns.concatenate([left, right])
+        if len(left) == 0 or len(right) == 0 or left.timestamps[-1] <= right.timestamps[0]:
+            return columns
+        from_right = _np.zeros(len(columns), dtype=bool)
+        from_right[_np.searchsorted(left.timestamps, right.timestamps, side="right") + _np.arange(len(right))] = True
+        order = _np.empty(len(columns), dtype=_np.int64)
+        order[~from_right] = _np.arange(len(left))
+        order[from_right] = _np.arange(len(left), len(columns))
+        return columns.take(order)
+
+    @staticmethod
+    def empty():
+        return MessageColumns(_np.zeros(0, dtype=_np.int64),
+                              _np.zeros(0, dtype=_np.int32),
+                              list(),
+                              b"",
+                              _np.zeros(1, dtype=_np.int64),
+                              _np.zeros(0, dtype=bool))
+
+    @staticmethod
+    def from_messages(messages):
+        """
+        :type messages: list of Message or Chat
+        :rtype: MessageColumns
+        """
+        timestamps = list()
+        codes = list()
+        media = list()
+        contents = list()
+        author_codes = dict()
+        for message in messages:
+            timestamps.append(message.timestamp)
+            codes.append(author_codes.setdefault(message.author, len(author_codes)))
+            media.append(message.media)
+            contents.append(message.content.encode("utf-8"))
+
+        authors = sorted(author_codes)
+        recode = _np.zeros(len(authors), dtype=_np.int32)
+        for code, author in enumerate(authors):
+            recode[author_codes[author]] = code
+
+        offsets = _np.zeros(len(contents) + 1, dtype=_np.int64)
+        _np.cumsum(list(len(content) for content in contents), out=offsets[1:])
+        return MessageColumns(_np.array(timestamps, dtype=_np.int64),
+                              recode[_np.array(codes, dtype=_np.int64)],
+                              authors,
+                              b"".join(contents),
+                              offsets,
+                              _np.array(media, dtype=bool))
+
+
+class MessageView(MessageColumns):
+    def __init__(self, columns, rows):
+        """Selection of messages from columns, which only copies a column when it is used and never copies the
+        contents unless the buffer itself is requested
+
+        :param columns: columns to select from, not a view itself
+        :type columns: MessageColumns
+        :param rows: positions of the selected messages in columns, a slice without step or an array
+        :type rows: slice or numpy.ndarray
+        """
+        if isinstance(rows, slice):
+            rows = slice(*rows.indices(columns.length)[:2])
+        self.base = columns
+        self.rows = rows
+        self.authors = columns.authors
+        self.length = len(range(columns.length)[rows]) if isinstance(rows, slice) else len(rows)
+        self._word_lists = None
+        self._lower_contents = None
+        self._lengths = None
+        self._fingerprint = None
+        self.__columns = dict()
+        self.__copy = None
+
+    def __get_column(self, name):
+        if name not in self.__columns:
+            self.__columns[name] = getattr(self.base, name)[self.rows]
+        return self.__columns[name]
+
+    @property
+    def timestamps(self):
+        return self.__get_column("timestamps")
+
+    @property
+    def author_codes(self):
+        return self.__get_column("author_codes")
+
+    @property
+    def media(self):
+        return self.__get_column("media")
+
+    @property
+    def buffer(self):
+        return self.copy().buffer
+
+    @property
+    def offsets(self):
+        return self.copy().offsets
+
+    def get_indices(self):
+        """
+        :return: positions of the selected messages in the base columns
+        :rtype: numpy.ndarray
+        """
+        if isinstance(self.rows, slice):
+            return _np.arange(self.rows.start, self.rows.stop, dtype=_np.int64)
+        return self.rows
+
+    def get_index(self, index):
+        """
+        :param index: position of a message in this view
+        :type index: int
+        :return: position of the message in the base columns, without creating all positions of a slice
+        :rtype: int
+        """
+        if isinstance(self.rows, slice):
+            return self.rows.start + range(self.length)[index]
+        return int(self.rows[index])
+
+    def copy(self):
+        """
+        :return: the selected messages as independent columns, created once
+        :rtype: MessageColumns
+        """
+        if self.__copy is None:
+            self.__copy = self.base.take(self.get_indices())
+        return self.__copy
+
+    def content(self, index):
+        return self.base.content(self.get_index(index))
+
+    def contents(self):
+        if self.__copy is not None:
+            return self.__copy.contents()
+        return self.base.iter_contents(self.get_indices())
+
+    def lengths(self):
+        return self.base.lengths()[self.rows]
+
+    def fingerprint(self):
+        """Hash of the base columns and the selected rows, so the contents aren't copied
+
+        :rtype: str
+        """
+        if self._fingerprint is None:
+            rows = self.rows
+            rows = f"{rows.start}:{rows.stop}".encode("ascii") if isinstance(rows, slice) else \
+                _np.asarray(rows, dtype=_np.int64)
+            self._fingerprint = _get_fingerprint((self.base.fingerprint().encode("ascii"), rows))
+        return self._fingerprint
+
+    def message(self, index):
+        return self.base.message(self.get_index(index))
+
+    def get_lower_contents(self):
+        if self._lower_contents is None and self.base._lower_contents is not None:
+            self._lower_contents = list(self.base._lower_contents[i] for i in self.get_indices().tolist())
+        return super().get_lower_contents()
+
+    def get_word_lists(self):
+        if self._word_lists is None and self.base._word_lists is not None:
+            self._word_lists = list(self.base._word_lists[i] for i in self.get_indices().tolist())
+        return super().get_word_lists()
+
+    def letter_counts(self, author_codes=None, authors=0):
+        return self.copy().letter_counts(author_codes, authors)
+
+    def take(self, indices):
+        return MessageView(self.base, self.get_indices()[_np.asarray(indices, dtype=_np.int64)])
+
+    def view(self, rows):
+        if isinstance(self.rows, slice) and isinstance(rows, slice):
+            return MessageView(self.base, slice(self.rows.start + rows.start, self.rows.start + rows.stop))
+        return MessageView(self.base, self.get_indices()[rows])
+
+
+def clean_mapped_content(content):
+    """
+    :param content: content of a message as it is in the chat file
+    :type content: bytes
+    :return: the content with every line break replaced by a space, like the lines of a message are joined when
+        reading the file as text
+    :rtype: bytes
+    """
+    if b"\r" in content:
+        content = content.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    return content.replace(b"\n", b" ")
+
+
+class MappedColumns(MessageColumns):
+    def __init__(self, data, starts, ends, timestamps, author_codes, authors, media, source=None):
+        """Columns of a memory-mapped chat file, the contents stay in the file until they're requested
+
+        Counting messages per time or author only uses the timestamps and author codes, statistics that need the
+        contents decode them a batch of messages at a time.
+
+        :param data: memory-mapped chat file
+        :type data: mmap.mmap or bytes
+        :param starts: offset in data of the content of every message
+        :type starts: numpy.ndarray
+        :param ends: offset in data of the end of the content of every message
+        :type ends: numpy.ndarray
+        :type timestamps: numpy.ndarray
+        :type author_codes: numpy.ndarray
+        :type authors: list of str
+        :type media: numpy.ndarray
+        :param source: path, size and modification time of the file when the columns hold all its messages, which
+            identify the messages without reading the file
+        :type source: None or (str, int, int)
+        """
+        self.data = data
+        self.starts = starts
+        self.ends = ends
+        self.timestamps = timestamps
+        self.author_codes = author_codes
+        self.authors = authors
+        self.media = media
+        self.source = source
+
+        self.length = len(timestamps)
+        self._word_lists = None
+        self._lower_contents = None
+        self._lengths = None
+        self._fingerprint = None
+        self.__columns = None
+
+    def materialize(self):
+        """
+        :return: the same messages with all contents decoded into memory, created once
+        :rtype: MessageColumns
+        """
+        if self.__columns is None:
+            self.__columns = self.get_batch(0, self.length)
+        return self.__columns
+
+    @property
+    def buffer(self):
+        return self.materialize().buffer
+
+    @property
+    def offsets(self):
+        return self.materialize().offsets
+
+    def fingerprint(self):
+        """Hash of the source of the file and the amount of messages, or of the file and the columns without a source
+
+        :rtype: str
+        """
+        if self._fingerprint is None and self.source is not None:
+            path, size, modified = self.source
+            self._fingerprint = _get_fingerprint((f"{path}\0{size}\0{modified}\0{self.length}".encode("utf-8"),))
+        if self._fingerprint is None:
+            self._fingerprint = _get_fingerprint((self.data, self.starts.astype(_np.int64),
+                                                  self.ends.astype(_np.int64), self.timestamps.astype(_np.int64),
+                                                  self.author_codes.astype(_np.int64),
+                                                  "\0".join(self.authors).encode("utf-8"),
+                                                  self.media.astype(_np.uint8)))
+        return self._fingerprint
+
+    def get_batch(self, start, stop):
+        """
+        :param start: position of the first message
+        :type start: int
+        :param stop: position after the last message
+        :type stop: int
+        :return: the messages from start to stop with their contents in memory
+        :rtype: MessageColumns
+        """
+        data = self.data
+        contents = list(clean_mapped_content(data[content_start:content_end]) for content_start, content_end
+                        in zip(self.starts[start:stop].tolist(), self.ends[start:stop].tolist()))
+        offsets = _np.zeros(len(contents) + 1, dtype=_np.int64)
+        _np.cumsum(list(map(len, contents)), out=offsets[1:])
+        return MessageColumns(self.timestamps[start:stop],
+                              self.author_codes[start:stop],
+                              self.authors,
+                              b"".join(contents),
+                              offsets,
+                              self.media[start:stop])
+
+    def batches(self, size=mapped_batch_size):
+        """
+        :param size: amount of messages per batch
+        :type size: int
+        :return: all messages in order, a batch at a time
+        :rtype: generator of MessageColumns
+        """
+        for start in range(0, self.length, size):
+            yield self.get_batch(start, min(start + size, self.length))
+
+    def content(self, index):
+        return clean_mapped_content(self.data[self.starts[index]:self.ends[index]]).decode("utf-8")
+
+    def contents(self):
+        return self.iter_contents(_np.arange(self.length))
+
+    def iter_contents(self, indices):
+        data = self.data
+        return (clean_mapped_content(data[start:end]).decode("utf-8")
+                for start, end in zip(self.starts[indices].tolist(), self.ends[indices].tolist()))
+
+    def lengths(self):
+        if self._lengths is None:
+            lengths = list(batch.lengths() for batch in self.batches())
+            self._lengths = _np.concatenate(lengths) if lengths else _np.zeros(0, dtype=_np.int64)
+        return self._lengths
+
+    def letter_counts(self, author_codes=None, authors=0):
+        counts = _np.zeros(len(alphabet) if author_codes is None else (authors, len(alphabet)), dtype=_np.int64)
+        for start, batch in zip(range(0, self.length, mapped_batch_size), self.batches()):
+            codes = None if author_codes is None else author_codes[start:start + mapped_batch_size]
+            counts += batch.letter_counts(codes, authors)
+        return counts
+
+    def take(self, indices):
+        indices = _np.asarray(indices, dtype=_np.int64)
+        columns = MappedColumns(self.data,
+                                self.starts[indices],
+                                self.ends[indices],
+                                self.timestamps[indices],
+                                self.author_codes[indices],
+                                self.authors,
+                                self.media[indices])
+        # Like a view, the selected rows of these columns identify the messages without hashing the file
+        columns._fingerprint = _get_fingerprint((self.fingerprint().encode("ascii"), indices))
+        return columns
+
+
 class Chat:
     def __init__(self, messages, authors, start_date, end_date, name):
         """
-        :type messages: list of Message
+        :type messages: list of Message or MessageColumns
         :type authors: list of str
         :type start_date: datetime.date
         :type end_date: datetime.date
@@ -233,6 +1178,43 @@ class Chat:
         self.name = name
 
         self.length = len(self.__messages)
+        self.__columns = None
+        self.__fingerprint = None
+        self.word_index = None
+
+    @property
+    def is_columnar(self):
+        return isinstance(self.__messages, MessageColumns)
+
+    @property
+    def columns(self):
+        """Columnar form of the messages, created once when the chat stores a list of Message
+
+        :rtype: MessageColumns
+        """
+        if self.is_columnar:
+            return self.__messages
+        if self.__columns is None:
+            self.__columns = MessageColumns.from_messages(self.__messages)
+        return self.__columns
+
+    def fingerprint(self):
+        """A list of Message is hashed without creating the columns, computed once
+
+        :return: hash of the messages, chats with the same messages have the same fingerprint
+        :rtype: str
+        """
+        if self.is_columnar:
+            return self.__messages.fingerprint()
+        if self.__fingerprint is None:
+            self.__fingerprint = MessageColumns.get_messages_fingerprint(self.__messages)
+        return self.__fingerprint
+
+    def to_columnar(self):
+        """
+        :rtype: Chat
+        """
+        return Chat(self.columns, self.authors, self.start_date, self.end_date, self.name)
 
     def get_date_range(self):
         return get_date_range(self.start_date, self.end_date)
@@ -265,20 +1247,38 @@ class Chat:
         raise StopIteration
 
     @staticmethod
-    def from_message_array(messages, name=""):
+    def from_message_array(messages, name="", columnar=False, is_sorted=False):
         """
-        :type messages: list of Message
+        :type messages: list of Message or MessageColumns
         :type name: str
+        :param columnar: store the messages as MessageColumns instead of a list of Message
+        :type columnar: bool
+        :param is_sorted: the messages are already sorted by time
+        :type is_sorted: bool
         :rtype: Chat
         """
-        messages = sorted(messages, key=lambda message: message.datetime)
-        authors = sorted(set(message.author for message in messages))
-        min_date = messages[0].datetime.date()
-        max_date = messages[-1].datetime.date()
+        if not isinstance(messages, MessageColumns):
+            if not is_sorted:
+                with _profiling.measure(Stage.sort, name="sorted") as measurement:
+                    messages = sorted(messages, key=lambda message: message.timestamp)
+                    measurement.add(len(messages))
+            authors = sorted(set(message.author for message in messages))
+            min_date = messages[0].datetime.date()
+            max_date = messages[-1].datetime.date()
+            if columnar:
+                messages = MessageColumns.from_messages(messages)
+            return Chat(messages, authors, min_date, max_date, name)
+
+        with _profiling.measure(Stage.sort, len(messages), "MessageColumns.sort"):
+            messages = messages.sort()
+        present = _np.bincount(messages.author_codes, minlength=len(messages.authors)) > 0
+        authors = list(author for author, is_present in zip(messages.authors, present) if is_present)
+        min_date = from_timestamp(messages.timestamps[0]).date()
+        max_date = from_timestamp(messages.timestamps[-1]).date()
         return Chat(messages, authors, min_date, max_date, name)
 
     @staticmethod
-    def from_string(content, date_format, name=""):
+    def from_string(content, date_format, name="", columnar=False):
         """Create Chat object from full chat text
 
         :param content: full chat text
@@ -286,13 +1286,16 @@ class Chat:
         :param date_format: DD-MM-YYYY or MM/DD/YY or DD-MM-YY
         :type date_format: str
         :type name: str
+        :type columnar: bool
         :rtype: Chat
         """
-        messages = separate_messages(content, date_format)
-        conversion_function = Message.get_conversion_function(date_format)
-        return Chat.from_message_array(get_message_array(messages, conversion_function), name)
+        messages = filter_messages(get_parser(date_format).parse_lines(content.split("\n")))
+        if columnar:
+            messages = MessageColumns.from_messages(messages)
+        return Chat.from_message_array(messages, name)
 
     @staticmethod
+    @_profiling.profile(Stage.filter, _profiling.count_items)
     def from_filter(messages, author_filter=None, date_filter=None, time_filter=None, length_filter=None, name=""):
         """Create Chat object from message list with specified filters
 
@@ -305,31 +1308,118 @@ class Chat:
         :param length_filter: minimum and maximum message length to filter
         :type length_filter: None or (int, int)
         :type name: str
-        :return: filtered chat
+        :return: filtered chat, stored as columns when the unfiltered chat was
         :rtype: Chat
         """
+        if isinstance(messages, Chat) and messages.is_columnar:
+            columns = messages.columns
+            start, stop = 0, len(columns)
+            if date_filter is not None:
+                # Chats are sorted by time, so the date range is one slice
+                min_date, max_date = date_filter
+                start = int(_np.searchsorted(columns.timestamps, to_timestamp(min_date), side="left"))
+                stop = int(_np.searchsorted(columns.timestamps, to_timestamp(max_date), side="right"))
+            mask = _get_filter_mask(columns, start, stop, author_filter, time_filter, length_filter)
+            rows = slice(start, stop) if mask is None else start + _np.flatnonzero(mask)
+            return Chat.from_message_array(columns.view(rows), name)
+
+        is_sorted = isinstance(messages, Chat)
+        if is_sorted:
+            messages = messages.__messages
+            if date_filter is not None:
+                min_date, max_date = (to_timestamp(date) for date in date_filter)
+                start = _bisect.bisect_left(messages, min_date, key=lambda message: message.timestamp)
+                stop = _bisect.bisect_right(messages, max_date, key=lambda message: message.timestamp)
+                messages = messages[start:stop]
+                date_filter = None
+
+        predicates = list()
         if author_filter is not None:
             if type(author_filter) is str:
-                messages = list(message for message in messages if message.author == author_filter)
-            else:
-                messages = list(message for message in messages if message.author in author_filter)
+                author_filter = [author_filter]
+            predicates.append(lambda message: message.author in author_filter)
         if date_filter is not None:
             min_date, max_date = date_filter
-            messages = list(message for message in messages if min_date <= message.datetime <= max_date)
+            predicates.append(lambda message: min_date <= message.datetime <= max_date)
         if time_filter is not None:
             min_time, max_time = time_filter
-            messages = list(message for message in messages if min_time <= message.datetime.time <= max_time)
+            predicates.append(lambda message: min_time <= message.datetime.time() <= max_time)
         if length_filter is not None:
             min_len, max_len = length_filter
-            messages = list(message for message in messages if min_len <= len(message.content) <= max_len)
-        return Chat.from_message_array(messages, name)
+            predicates.append(lambda message: min_len <= len(message.content) <= max_len)
+        if predicates:
+            messages = list(message for message in messages if all(predicate(message) for predicate in predicates))
+        return Chat.from_message_array(messages, name, is_sorted=is_sorted)
 
     @staticmethod
-    def from_file(filename, name=""):
+    def from_file(filename, name="", columnar=False, cache=None):
         """Create Chat object from text file located in the folder specified in constants
 
+        The file is read one line at a time, so only the messages themselves are kept in memory.
+
+        :param columnar: store the messages as MessageColumns instead of a list of Message
+        :type columnar: bool
+        :param cache: cache to load the parsed chat from, or to store it in after parsing
+        :type cache: None or cache.ChatCache
         :rtype: Chat
         """
-        content = get_chat_file_content(filename)
-        date_format = get_date_format(content)
-        return Chat.from_string(content, date_format, name)
+        path = f"{Directory.folder_chats}/{filename}"
+        arrays = None
+        if cache is not None:
+            with _profiling.measure(Stage.read, name="ChatCache.load"):
+                arrays = cache.load(path)
+        if arrays is not None:
+            with _profiling.measure(Stage.convert, name="MessageColumns.from_arrays") as measurement:
+                messages = MessageColumns.from_arrays(arrays)
+                messages = messages if columnar else list(messages)
+                measurement.add(len(messages))
+            return Chat.from_message_array(messages, name)
+
+        lines = _profiling.iterate(Stage.read, read_chat_file(filename))
+        sample = list(_itertools.islice(lines, format_detection_lines))
+        date_format = detect_date_format(sample)
+        messages = _profiling.iterate(Stage.parse, get_parser(date_format).parse_lines(_itertools.chain(sample, lines)))
+        messages = _profiling.iterate(Stage.filter, filter_messages(messages))
+        if columnar or cache is not None:
+            with _profiling.measure(Stage.convert, name="MessageColumns.from_messages") as measurement:
+                messages = MessageColumns.from_messages(messages)
+                measurement.add(len(messages))
+            if cache is not None:
+                cache.store(path, messages.to_arrays())
+            if not columnar:
+                messages = list(messages)
+        else:
+            with _profiling.measure(Stage.convert, name="list") as measurement:
+                messages = list(messages)
+                measurement.add(len(messages))
+        return Chat.from_message_array(messages, name)
+
+
+def _get_filter_mask(columns, start, stop, author_filter, time_filter, length_filter):
+    """Combine the filters of Chat.from_filter into one mask over the messages of columnar storage
+
+    :type columns: MessageColumns
+    :param start: position of the first message to filter
+    :type start: int
+    :param stop: position after the last message to filter
+    :type stop: int
+    :return: mask over the messages from start to stop, None when there's nothing to filter
+    :rtype: numpy.ndarray of bool or None
+    """
+    if author_filter is None and time_filter is None and length_filter is None:
+        return None
+    mask = _np.ones(stop - start, dtype=bool)
+    if author_filter is not None:
+        if type(author_filter) is str:
+            author_filter = [author_filter]
+        codes = list(code for code, author in enumerate(columns.authors) if author in author_filter)
+        mask &= _np.isin(columns.author_codes[start:stop], codes)
+    if time_filter is not None:
+        min_time, max_time = (time.hour * 3600 + time.minute * 60 + time.second for time in time_filter)
+        seconds = columns.timestamps[start:stop] % 86400
+        mask &= (min_time <= seconds) & (seconds <= max_time)
+    if length_filter is not None:
+        min_len, max_len = length_filter
+        lengths = columns.lengths()[start:stop]
+        mask &= (min_len <= lengths) & (lengths <= max_len)
+    return mask
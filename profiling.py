@@ -0,0 +1,240 @@
+import functools as _functools
+import json as _json
+import time as _time
+import tracemalloc as _tracemalloc
+
+_enabled = False
+_trace_memory = False
+_records = dict()
+_stack = list()
+
+
+class StageRecord:
+    def __init__(self, stage, name):
+        """Totals of every measurement of one stage
+
+        :param stage: stage from constants.Stage
+        :type stage: str
+        :param name: what was measured within the stage, like a function name
+        :type name: str
+        """
+        self.stage = stage
+        self.name = name
+        self.calls = 0
+        self.items = 0
+        self.seconds = 0.0
+        self.own_seconds = 0.0
+        self.memory = None
+
+    def to_dict(self):
+        """
+        :return: totals, where seconds includes and own_seconds excludes the time of stages measured inside it, memory
+            is None when it wasn't traced
+        :rtype: dict
+        """
+        return dict(stage=self.stage, name=self.name, calls=self.calls, items=self.items, seconds=self.seconds,
+                    own_seconds=self.own_seconds, memory=self.memory)
+
+
+class _Measurement:
+    def __init__(self, record, items=0):
+        self.record = record
+        self.items = items
+        self.children = 0.0
+        self.start = 0.0
+        self.memory = 0
+
+    def add(self, items):
+        """
+        :param items: amount of items processed in the measured stage
+        :type items: int
+        """
+        self.items += items
+
+    def __enter__(self):
+        _stack.append(self)
+        if _trace_memory:
+            self.memory = _tracemalloc.get_traced_memory()[0]
+        self.start = _time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = _time.perf_counter() - self.start
+        _stack.pop()
+        if _stack:
+            _stack[-1].children += elapsed
+        record = self.record
+        record.seconds += elapsed
+        record.own_seconds += elapsed - self.children
+        record.items += self.items
+        if _trace_memory:
+            record.memory = (record.memory or 0) + _tracemalloc.get_traced_memory()[0] - self.memory
+        self.children = 0.0
+        return False
+
+
+class _NoMeasurement:
+    def add(self, items):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_no_measurement = _NoMeasurement()
+
+
+def enable(memory=False):
+    """Start recording stages, nothing is recorded until this is called
+
+    :param memory: also record how much the allocated memory changed in every stage, which slows everything down
+    :type memory: bool
+    """
+    global _enabled, _trace_memory
+    _enabled = True
+    _trace_memory = memory
+    if memory and not _tracemalloc.is_tracing():
+        _tracemalloc.start()
+
+
+def disable():
+    global _enabled, _trace_memory
+    if _trace_memory and _tracemalloc.is_tracing():
+        _tracemalloc.stop()
+    _enabled = False
+    _trace_memory = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    _records.clear()
+
+
+def get_record(stage, name):
+    """
+    :type stage: str
+    :type name: str
+    :rtype: StageRecord
+    """
+    key = (stage, name)
+    if key not in _records:
+        _records[key] = StageRecord(stage, name)
+    return _records[key]
+
+
+def measure(stage, items=0, name=None):
+    """Measure the code in a with block as one call of a stage
+
+    :param stage: stage from constants.Stage
+    :type stage: str
+    :param items: amount of items processed, more can be added with add on the returned measurement
+    :type items: int
+    :param name: what is measured within the stage, defaults to the stage
+    :type name: None or str
+    :return: context manager, which does nothing when profiling is disabled
+    """
+    if not _enabled:
+        return _no_measurement
+    record = get_record(stage, stage if name is None else name)
+    record.calls += 1
+    return _Measurement(record, items)
+
+
+def iterate(stage, iterable, name=None):
+    """Measure the time spent producing the items of an iterable, for stages that stream into each other
+
+    :param stage: stage from constants.Stage
+    :type stage: str
+    :type iterable: Iterable
+    :param name: what is measured within the stage, defaults to the stage
+    :type name: None or str
+    :return: the iterable itself when profiling is disabled
+    :rtype: Iterable
+    """
+    if not _enabled:
+        return iterable
+    record = get_record(stage, stage if name is None else name)
+    record.calls += 1
+    return _iterate(record, iter(iterable))
+
+
+def _iterate(record, iterator):
+    while True:
+        with _Measurement(record) as measurement:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            measurement.add(1)
+        yield item
+
+
+def profile(stage, items=None):
+    """Decorator measuring every call of a function as a stage, named after the function
+
+    :param stage: stage from constants.Stage
+    :type stage: str
+    :param items: function returning the amount of items processed from the arguments of a call
+    :type items: None or function
+    :rtype: function
+    """
+    def decorator(function):
+        @_functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with measure(stage, 0 if items is None else items(*args, **kwargs), function.__qualname__):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count_items(first, *args, **kwargs):
+    """
+    :param first: first argument of a profiled function, like a chat or a DataFrame
+    :return: length of the first argument, 0 when it has no length
+    :rtype: int
+    """
+    try:
+        return len(first)
+    except TypeError:
+        return 0
+
+
+def get_results():
+    """
+    :return: totals of every recorded stage, slowest first
+    :rtype: list of dict
+    """
+    return sorted((record.to_dict() for record in _records.values()), key=lambda result: -result["own_seconds"])
+
+
+def get_summary():
+    """
+    :return: table with the totals of every recorded stage, slowest first
+    :rtype: str
+    """
+    lines = [f"{'Stage':<10} {'Name':<36} {'Calls':>8} {'Items':>12} {'Total (s)':>10} {'Own (s)':>10} "
+             f"{'Items/s':>14} {'Memory (MiB)':>13}"]
+    for result in get_results():
+        throughput = f"{result['items'] / result['seconds']:14,.0f}" if result["items"] and result["seconds"] \
+            else f"{'':>14}"
+        memory = f"{result['memory'] / 1024 ** 2:13.1f}" if result["memory"] is not None else f"{'':>13}"
+        lines.append(f"{result['stage']:<10} {result['name'][:36]:<36} {result['calls']:>8,} {result['items']:>12,} "
+                     f"{result['seconds']:10.4f} {result['own_seconds']:10.4f} {throughput} {memory}")
+    return "\n".join(lines)
+
+
+def save(path):
+    """
+    :param path: JSON file to write the totals of every recorded stage to
+    :type path: str
+    """
+    with open(path, "w", encoding="utf-8") as file:
+        _json.dump(get_results(), file, indent=1)
@@ -0,0 +1,143 @@
+import io
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+
+import visualisation
+from constants import *
+from main import ChatData
+from message import Chat
+from profiling import measure
+
+
+def get_chat_figures(chat, title=None):
+    """Figures of the report of one chat, the data is computed here so workers only have to render
+
+    :type chat: Chat
+    :param title: title above every figure of the chat, defaults to the name of the chat
+    :type title: None or str
+    :return: function from visualisation, its arguments and the title of every figure, in report order
+    :rtype: list of (function, tuple, str)
+    """
+    title = chat.name if title is None else title
+    figures = [(visualisation.get_figure_date, (ChatData.from_command_chat(chat, Result.date),), title),
+               (visualisation.get_figure_1, (ChatData.from_command_chat(chat, Result.hour), "Messages per hour",
+                                             "Hour", "Messages"), title),
+               (visualisation.get_figure_days, (ChatData.from_command_chat(chat, Result.day),), title)]
+    frequencies = ChatData.filter_unique_words(ChatData.unique_words(chat))
+    if frequencies:
+        # A fixed random state places the words the same way on every run
+        figures.append((visualisation.word_cloud, (frequencies, 0), title))
+    return figures
+
+
+def render_figure(function, args=(), title=None, dpi=None):
+    """Render one figure with the non-interactive backend, this runs in the worker processes
+
+    :param function: figure function from visualisation, returning a figure and axes or a word cloud
+    :type function: function
+    :param args: arguments of the function
+    :type args: tuple
+    :param title: put in front of the title of the figure
+    :type title: None or str
+    :param dpi: rasterize the figure at this resolution, None keeps it a vector figure
+    :type dpi: None or int
+    :return: the figure pickled, or as PNG when rasterized
+    :rtype: bytes
+    """
+    matplotlib.use("Agg")
+    from matplotlib import pyplot as plt
+
+    result = function(*args)
+    if isinstance(result, tuple):
+        figure, ax = result
+    else:
+        # Word clouds are images, not figures
+        size = dpi or report_dpi
+        figure, ax = plt.subplots(figsize=(result.width / size, result.height / size))
+        ax.imshow(result.to_array(), interpolation="bilinear")
+        ax.set_axis_off()
+    if title:
+        ax.set_title(f"{title} - {ax.get_title()}" if ax.get_title() else title)
+
+    if dpi is None:
+        page = pickle.dumps(figure)
+    else:
+        image = io.BytesIO()
+        figure.savefig(image, format="png", dpi=dpi)
+        page = image.getvalue()
+    plt.close(figure)
+    return page
+
+
+def render_figures(figures, processes=None, dpi=None):
+    """
+    :param figures: figures like get_chat_figures returns them
+    :type figures: list of (function, tuple, str)
+    :param processes: amount of processes, defaults to the amount of CPUs, 1 renders in this process
+    :type processes: None or int
+    :param dpi: rasterize the figures at this resolution, None keeps them vector figures
+    :type dpi: None or int
+    :return: every figure like render_figure returns it, in the same order as the figures
+    :rtype: list of bytes
+    """
+    with measure(Stage.render, len(figures), "render_figures"):
+        if processes == 1 or len(figures) <= 1:
+            return list(render_figure(function, args, title, dpi) for function, args, title in figures)
+        with ProcessPoolExecutor(min(processes or os.cpu_count(), len(figures))) as executor:
+            return list(executor.map(render_figure, *zip(*figures), [dpi] * len(figures)))
+
+
+def save_report(pages, filename="report.pdf", dpi=None):
+    """Put every figure on its own page of a single PDF, in the order of the pages
+
+    :param pages: figures like render_figures returns them
+    :type pages: list of bytes
+    :type filename: str
+    :param dpi: resolution the figures were rasterized at, which determines the page size, None for vector figures
+    :type dpi: None or int
+    """
+    from matplotlib.backends import backend_pdf
+    from matplotlib.figure import Figure
+    from matplotlib.image import imread
+
+    with measure(Stage.render, len(pages), "save_report"):
+        # Without a creation date the same figures always produce the same file
+        with backend_pdf.PdfPages(filename, metadata={"CreationDate": None}) as pdf:
+            for page in pages:
+                if dpi is None:
+                    pdf.savefig(pickle.loads(page))
+                    continue
+                pixels = imread(io.BytesIO(page), format="png")
+                figure = Figure(figsize=(pixels.shape[1] / dpi, pixels.shape[0] / dpi), dpi=dpi)
+                figure.figimage(pixels)
+                pdf.savefig(figure)
+
+
+def create_report(chats, filename="report.pdf", authors=False, processes=None, dpi=None):
+    """Render the figures of many chats on multiple processes into a single PDF
+
+    :type chats: list of Chat
+    :type filename: str
+    :param authors: also add the figures of every author of every chat
+    :type authors: bool
+    :param processes: amount of processes, defaults to the amount of CPUs
+    :type processes: None or int
+    :param dpi: rasterize the figures at this resolution, None keeps the report vector graphics
+    :type dpi: None or int
+    """
+    figures = list()
+    for chat in chats:
+        figures += get_chat_figures(chat)
+        if authors:
+            for author in chat.authors:
+                figures += get_chat_figures(Chat.from_filter(chat, author_filter=author), f"{chat.name} - {author}")
+    save_report(render_figures(figures, processes, dpi), filename, dpi)
+
+
+if __name__ == '__main__':
+    from ingest import load_chats
+
+    create_report(load_chats())
@@ -0,0 +1,162 @@
+from collections import Counter as _Counter
+import re as _re
+
+from constants import min_automaton_patterns
+from message import get_words
+
+
+class AhoCorasick:
+    def __init__(self, patterns):
+        """Automaton that counts the occurrences of many literal patterns in one pass over a text
+
+        Occurrences of the same pattern are counted without overlap, like str.count does.
+
+        :param patterns: non-empty patterns
+        :type patterns: list of str
+        """
+        self.patterns = patterns
+        self.counts = [0] * len(patterns)
+
+        self.goto = [dict()]
+        self.fail = [0]
+        self.outputs = [list()]
+        for i, pattern in enumerate(patterns):
+            state = 0
+            for character in pattern:
+                if character not in self.goto[state]:
+                    self.goto[state][character] = len(self.goto)
+                    self.goto.append(dict())
+                    self.fail.append(0)
+                    self.outputs.append(list())
+                state = self.goto[state][character]
+            self.outputs[state].append(i)
+
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for character, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail and character not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_state] = self.goto[fail].get(character, 0)
+                self.outputs[next_state] = self.outputs[next_state] + self.outputs[self.fail[next_state]]
+
+        self.lengths = list(len(pattern) for pattern in patterns)
+        self.__position = 0
+        self.__next_start = [0] * len(patterns)
+
+    def feed(self, text):
+        """Count the occurrences in a text, occurrences never continue from one text into the next
+
+        :type text: str
+        """
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        counts, next_start, lengths = self.counts, self.__next_start, self.lengths
+        state = 0
+        position = self.__position
+        for character in text:
+            while state and character not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(character, 0)
+            position += 1
+            for i in outputs[state]:
+                start = position - lengths[i]
+                if start >= next_start[i]:
+                    counts[i] += 1
+                    next_start[i] = position
+        # Skip a position, so an occurrence can't start in this text and end in the next
+        self.__position = position + 1
+
+
+class MultiSearch:
+    def __init__(self, patterns, match_case, words, regex):
+        """Search for many patterns at once, each with its own options like ChatData.search
+
+        Every message is lowercased and split into words at most once. Literal patterns are counted with str.count
+        on all messages at once, or by an Aho-Corasick automaton when there are very many, words in one pass over all
+        words, and regular expressions are compiled once.
+
+        :type patterns: list of str
+        :type match_case: list of bool
+        :type words: list of bool
+        :type regex: list of bool
+        """
+        self.patterns = patterns
+        self.literals = {True: list(), False: list()}
+        self.words = {True: list(), False: list()}
+        self.regexes = {True: list(), False: list()}
+        self.empty = {True: list(), False: list()}
+        for i, pattern in enumerate(patterns):
+            if not match_case[i]:
+                pattern = pattern.lower()
+            if regex[i]:
+                self.regexes[match_case[i]].append((i, _re.compile(pattern)))
+            elif words[i]:
+                self.words[match_case[i]].append((i, pattern))
+            elif pattern:
+                self.literals[match_case[i]].append((i, pattern))
+            else:
+                self.empty[match_case[i]].append(i)
+
+    def count(self, get_contents, get_lower_contents, get_word_lists):
+        """
+        :param get_contents: function returning the content of every message
+        :type get_contents: function
+        :param get_lower_contents: function returning the lowercase content of every message like Message.lower
+        :type get_lower_contents: function
+        :param get_word_lists: function returning the words of every message like Message.get_words
+        :type get_word_lists: function
+        :return: number of occurrences of every pattern
+        :rtype: list of int
+        """
+        results = [0] * len(self.patterns)
+        for case in (True, False):
+            if not (self.literals[case] or self.words[case] or self.regexes[case] or self.empty[case]):
+                continue
+            texts = get_contents() if case else get_lower_contents()
+            self.__count_literals(texts, self.literals[case], results)
+            if self.words[case]:
+                self.__count_words(map(get_words, texts) if case else get_word_lists(), self.words[case], results)
+            for i, pattern in self.regexes[case]:
+                results[i] = sum(len(pattern.findall(text)) for text in texts)
+            for i in self.empty[case]:
+                # str.count finds an empty pattern before every character and at the end
+                results[i] = sum(map(len, texts)) + len(texts)
+        return results
+
+    @staticmethod
+    def __count_literals(texts, literals, results):
+        """
+        :type texts: list of str
+        :param literals: position and non-empty pattern of every literal
+        :type literals: list of (int, str)
+        :param results: number of occurrences of every pattern, filled in for the literals
+        :type results: list of int
+        """
+        # The automaton runs in Python, str.count runs in C and is faster until there are very many patterns
+        if len(literals) >= min_automaton_patterns:
+            automaton = AhoCorasick(list(pattern for i, pattern in literals))
+            for text in texts:
+                automaton.feed(text)
+            for (i, pattern), count in zip(literals, automaton.counts):
+                results[i] = count
+            return
+        # A separator no pattern contains keeps occurrences within one text, so all texts are searched at once
+        joined = "\0".join(texts) if literals else ""
+        for i, pattern in literals:
+            results[i] = joined.count(pattern) if "\0" not in pattern else sum(text.count(pattern) for text in texts)
+
+    @staticmethod
+    def __count_words(word_lists, words, results):
+        """
+        :param word_lists: words of every message
+        :type word_lists: Iterable of list of str
+        :param words: position and word of every word pattern
+        :type words: list of (int, str)
+        :param results: number of occurrences of every pattern, filled in for the words
+        :type results: list of int
+        """
+        wanted = set(pattern for i, pattern in words)
+        counts = _Counter(word for word_list in word_lists for word in word_list if word in wanted)
+        for i, pattern in words:
+            results[i] = counts[pattern]
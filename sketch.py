@@ -0,0 +1,288 @@
+import hashlib as _hashlib
+import math as _math
+import sys as _sys
+from collections import Counter as _Counter
+
+import numpy as _np
+
+from constants import Filter, mapped_batch_size, min_word_frequency_length, sketch_error, \
+    sketch_failure_probability, vocabulary_memory, vocabulary_top
+from message import get_words
+
+# Bytes of a dictionary entry besides the word itself, the slot in the hash table and the count
+_entry_size = 64
+
+
+class CountMinSketch:
+    def __init__(self, width, depth):
+        """Table of counters that overestimates the count of every word by a bounded amount, in fixed memory
+
+        Every word is counted in one counter of every row, the estimate of a word is the smallest of its counters.
+
+        :param width: counters per row, the overestimate is at most e / width times the total count
+        :type width: int
+        :param depth: rows, the overestimate stays within the bound with probability 1 - e ** -depth
+        :type depth: int
+        """
+        self.width = width
+        self.depth = depth
+        self.table = _np.zeros((depth, width), dtype=_np.int64)
+        self.total = 0
+
+    @staticmethod
+    def from_error(error=sketch_error, probability=sketch_failure_probability, max_size=None):
+        """
+        :param error: maximum overestimate as a fraction of the total count
+        :type error: float
+        :param probability: probability of an estimate being off by more than the error
+        :type probability: float
+        :param max_size: maximum size of the table in bytes, a smaller table than the error needs gives a larger error
+        :type max_size: None or int
+        :rtype: CountMinSketch
+        """
+        width = _math.ceil(_math.e / error)
+        depth = _math.ceil(_math.log(1 / probability))
+        if max_size is not None:
+            width = max(1, min(width, max_size // (depth * _np.dtype(_np.int64).itemsize)))
+        return CountMinSketch(width, depth)
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    def get_error(self):
+        """
+        :return: maximum overestimate of any count, unless the sketch was unlucky
+        :rtype: float
+        """
+        return _math.e / self.width * self.total
+
+    def get_columns(self, words):
+        """
+        :type words: list of str
+        :return: counter of every word in every row, one row per word
+        :rtype: np.ndarray
+        """
+        # Hashes that are the same in every process, so the same words always give the same estimates
+        hashes = _np.frombuffer(b"".join(_hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+                                         for word in words), dtype=_np.uint64)
+        # Rows combine two halves of one hash, which is as good as a separate hash per row
+        rows = _np.arange(self.depth, dtype=_np.uint64)
+        columns = (hashes[:, _np.newaxis] & 0xFFFFFFFF) + rows * (hashes[:, _np.newaxis] >> _np.uint64(32))
+        return (columns % _np.uint64(self.width)).astype(_np.int64)
+
+    def add(self, words, counts):
+        """
+        :type words: list of str
+        :param counts: count of every word
+        :type counts: np.ndarray
+        """
+        columns = self.get_columns(words)
+        for row in range(self.depth):
+            _np.add.at(self.table[row], columns[:, row], counts)
+        self.total += int(counts.sum())
+
+    def estimate(self, words):
+        """
+        :type words: list of str
+        :return: estimated count of every word, never lower than the real count
+        :rtype: np.ndarray
+        """
+        if not words:
+            return _np.zeros(0, dtype=_np.int64)
+        return self.table[_np.arange(self.depth), self.get_columns(words)].min(axis=1)
+
+
+class WordCounter:
+    def __init__(self, memory_budget=vocabulary_memory, top=vocabulary_top, error=sketch_error,
+                 probability=sketch_failure_probability, filter_words=False):
+        """Word frequencies in bounded memory, exact until the words take more memory than the budget
+
+        Beyond the budget all words are counted in a CountMinSketch and only the top most frequent words are kept,
+        with counts that are at most get_error too high. The sketch and the top words stay within the same budget, so
+        a budget too small for the error gives a larger error, which get_error reports. The top words are always kept,
+        even when they alone take more than the budget.
+
+        :param memory_budget: bytes the counted words may take, and the sketch with the top words afterwards
+        :type memory_budget: int
+        :param top: amount of most frequent words kept once counts are approximate
+        :type top: int
+        :param error: maximum overestimate of approximate counts as a fraction of all counted words, when the budget
+            fits a sketch that large
+        :type error: float
+        :param probability: probability an approximate count is off by more than the error
+        :type probability: float
+        :param filter_words: only count words filter_unique_words would keep, so common words don't take the place
+            of the top words
+        :type filter_words: bool
+        """
+        self.memory_budget = memory_budget
+        self.top = top
+        self.error = error
+        self.probability = probability
+        self.filter_words = filter_words
+
+        # Every word while counting exactly, the top words afterwards
+        self.counts = dict()
+        self.memory = 0
+        self.total = 0
+        self.sketch = None
+
+    @property
+    def is_exact(self):
+        return self.sketch is None
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __getitem__(self, word):
+        """
+        :type word: str
+        :return: count of the word, an overestimate once counts are approximate
+        :rtype: int
+        """
+        if word in self.counts or self.is_exact:
+            return self.counts.get(word, 0)
+        return int(self.sketch.estimate([word])[0])
+
+    def get_error(self):
+        """
+        :return: maximum overestimate of any count, with probability 1 - probability
+        :rtype: float
+        """
+        return 0.0 if self.is_exact else self.sketch.get_error()
+
+    def add(self, words):
+        """
+        :param words: words like Message.get_words returns them
+        :type words: Iterable of str
+        """
+        self.add_counts(_Counter(words))
+
+    def add_counts(self, counts):
+        """
+        :param counts: count of every word
+        :type counts: dict of str to int
+        """
+        if self.filter_words:
+            counts = {word: count for word, count in counts.items()
+                      if len(word) >= min_word_frequency_length and word not in Filter.words}
+        if not counts:
+            return
+        self.total += sum(counts.values())
+        if self.is_exact:
+            for word, count in counts.items():
+                if word in self.counts:
+                    self.counts[word] += count
+                else:
+                    self.counts[word] = count
+                    self.memory += _sys.getsizeof(word) + _entry_size
+            if self.memory > self.memory_budget:
+                self.__start_sketch()
+            return
+
+        words = list(counts)
+        self.sketch.add(words, _np.fromiter(counts.values(), dtype=_np.int64, count=len(words)))
+        candidates = list(self.counts) + list(word for word in words if word not in self.counts)
+        self.counts = self.__get_top(candidates, self.sketch.estimate(candidates))
+
+    def __start_sketch(self):
+        # The top words are expected to take as much memory per word as the words counted so far
+        reserved = self.top * self.memory // len(self.counts)
+        self.sketch = CountMinSketch.from_error(self.error, self.probability, self.memory_budget - reserved)
+        words = list(self.counts)
+        counts = _np.fromiter(self.counts.values(), dtype=_np.int64, count=len(words))
+        self.sketch.add(words, counts)
+        self.counts = self.__get_top(words, counts)
+        self.memory = self.sketch.nbytes + sum(_sys.getsizeof(word) + _entry_size for word in self.counts)
+
+    def __get_top(self, words, counts):
+        """
+        :type words: list of str
+        :type counts: np.ndarray
+        :return: the top most frequent words with their counts
+        :rtype: dict of str to int
+        """
+        if len(words) > self.top:
+            positions = _np.argpartition(-counts, self.top - 1)[:self.top]
+            words = list(words[position] for position in positions.tolist())
+            counts = counts[positions]
+        return dict(zip(words, counts.tolist()))
+
+    def most_common(self, n=None):
+        """
+        :param n: amount of words, defaults to all kept words
+        :type n: None or int
+        :return: most frequent words and their counts, most frequent first
+        :rtype: list of (str, int)
+        """
+        return sorted(self.counts.items(), key=lambda item: -item[1])[:n]
+
+    def frequencies(self, n=None):
+        """
+        :param n: amount of words, defaults to top
+        :type n: None or int
+        :return: most frequent words and their counts, like filter_unique_words returns them for word_cloud
+        :rtype: dict of str to int
+        """
+        return dict(self.most_common(self.top if n is None else n))
+
+
+def iter_word_batches(chat, batch_size=mapped_batch_size):
+    """Words of a chat a batch of messages at a time, so the words of the whole chat are never in memory at once
+
+    :type chat: message.Chat
+    :param batch_size: amount of messages per batch
+    :type batch_size: int
+    :return: author and words of every message in the batch
+    :rtype: generator of (list of str, list of list of str)
+    """
+    if not chat.is_columnar:
+        messages = list(chat)
+        for start in range(0, len(messages), batch_size):
+            batch = messages[start:start + batch_size]
+            # Message.get_words would keep the words of every message
+            yield (list(message.author for message in batch),
+                   list(get_words(message.content.lower()) for message in batch))
+        return
+    columns = chat.columns
+    authors = _np.array(columns.authors, dtype=object)
+    for start in range(0, len(columns), batch_size):
+        indices = _np.arange(start, min(start + batch_size, len(columns)))
+        yield (authors[columns.author_codes[indices]].tolist(),
+               list(get_words(content.lower()) for content in columns.iter_contents(indices)))
+
+
+def count_words(chat, batch_size=mapped_batch_size, **kwargs):
+    """
+    :type chat: message.Chat
+    :param batch_size: amount of messages counted at once
+    :type batch_size: int
+    :param kwargs: arguments of WordCounter
+    :rtype: WordCounter
+    """
+    counter = WordCounter(**kwargs)
+    for _, word_lists in iter_word_batches(chat, batch_size):
+        counter.add(word for words in word_lists for word in words)
+    return counter
+
+
+def count_words_per_author(chat, memory_budget=vocabulary_memory, batch_size=mapped_batch_size, **kwargs):
+    """
+    :type chat: message.Chat
+    :param memory_budget: bytes the counters of all authors together may take, split evenly between the authors
+    :type memory_budget: int
+    :param batch_size: amount of messages counted at once
+    :type batch_size: int
+    :param kwargs: arguments of WordCounter
+    :return: word counter of every author of the chat
+    :rtype: dict of str to WordCounter
+    """
+    counters = {author: WordCounter(memory_budget // max(1, len(chat.authors)), **kwargs) for author in chat.authors}
+    for authors, word_lists in iter_word_batches(chat, batch_size):
+        batch = {author: _Counter() for author in counters}
+        for author, words in zip(authors, word_lists):
+            batch[author].update(words)
+        for author, counts in batch.items():
+            counters[author].add_counts(counts)
+    return counters
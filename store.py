@@ -0,0 +1,413 @@
+import datetime as _datetime
+import re as _re
+import sqlite3 as _sqlite3
+
+import numpy as _np
+import pandas as _pd
+
+from cache import get_file_hash
+from constants import Directory, Result, Stage
+from message import Chat, MessageColumns, get_date_range, get_day_buckets, get_words, to_timestamp
+import profiling as _profiling
+
+_schema = """
+CREATE TABLE IF NOT EXISTS chats (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    hash TEXT
+);
+CREATE TABLE IF NOT EXISTS authors (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    chat INTEGER NOT NULL REFERENCES chats (id),
+    timestamp INTEGER NOT NULL,
+    author INTEGER NOT NULL REFERENCES authors (id),
+    content TEXT NOT NULL,
+    media INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_chat ON messages (chat, timestamp);
+CREATE INDEX IF NOT EXISTS messages_timestamp ON messages (timestamp);
+CREATE INDEX IF NOT EXISTS messages_author ON messages (author, timestamp);
+"""
+# The full-text index only refers to the rows of messages, so the contents are not stored twice
+_fts_schema = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5 (
+    content, content='messages', content_rowid='id', tokenize='unicode61'
+);
+"""
+
+
+def _count(content, pattern, match_case, words, regex):
+    """Occurrences of a search in one message, counted exactly like ChatData.search"""
+    text = content if match_case else content.lower()
+    if words and not regex:
+        return get_words(text).count(pattern)
+    if regex:
+        return len(_re.findall(pattern, text))
+    return text.count(pattern)
+
+
+def has_fts5():
+    """
+    :return: whether the SQLite library Python uses was compiled with FTS5
+    :rtype: bool
+    """
+    connection = _sqlite3.connect(":memory:")
+    try:
+        connection.execute("CREATE VIRTUAL TABLE test USING fts5 (content)")
+        return True
+    except _sqlite3.OperationalError:
+        return False
+    finally:
+        connection.close()
+
+
+class ChatStore:
+    def __init__(self, path=Directory.file_store, full_text=None):
+        """SQLite database with the messages of many chats, so queries across chats are answered with the indexes of
+        the database instead of loading every chat
+
+        The filters of all queries work like the filters of Chat.from_filter, with chat_filter selecting chats by name.
+
+        :param path: database file, created when it doesn't exist, ":memory:" keeps the database in memory
+        :type path: str
+        :param full_text: keep a full-text index of the contents for word searches, defaults to whether SQLite
+            supports FTS5
+        :type full_text: None or bool
+        """
+        self.path = path
+        self.connection = _sqlite3.connect(path)
+        self.connection.create_function("search_count", 5, _count, deterministic=True)
+        self.full_text = has_fts5() if full_text is None else full_text
+        with self.connection:
+            self.connection.executescript(_schema)
+            if self.full_text:
+                self.connection.executescript(_fts_schema)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def get_chat_names(self):
+        """
+        :rtype: list of str
+        """
+        return list(name for name, in self.connection.execute("SELECT name FROM chats ORDER BY name"))
+
+    def get_authors(self, **filters):
+        """
+        :param filters: chat_filter, author_filter, date_filter, time_filter and length_filter
+        :return: authors of the selected messages, sorted like Chat.authors
+        :rtype: list of str
+        """
+        where, parameters = self._where(**filters)
+        query = f"SELECT DISTINCT authors.name FROM messages JOIN authors ON authors.id = messages.author WHERE {where}"
+        return sorted(name for name, in self.connection.execute(query, parameters))
+
+    def count_messages(self, **filters):
+        """
+        :param filters: chat_filter, author_filter, date_filter, time_filter and length_filter
+        :rtype: int
+        """
+        where, parameters = self._where(**filters)
+        return self.connection.execute(f"SELECT COUNT(*) FROM messages WHERE {where}", parameters).fetchone()[0]
+
+    def _get_author_ids(self, authors):
+        """
+        :type authors: list of str
+        :return: id of every author, authors that aren't stored yet are added
+        :rtype: dict of str to int
+        """
+        self.connection.executemany("INSERT OR IGNORE INTO authors (name) VALUES (?)",
+                                    ((author,) for author in authors))
+        ids = dict()
+        for start in range(0, len(authors), 500):
+            part = authors[start:start + 500]
+            query = f"SELECT name, id FROM authors WHERE name IN ({', '.join('?' * len(part))})"
+            ids.update(self.connection.execute(query, part))
+        return ids
+
+    @_profiling.profile(Stage.convert)
+    def add_chat(self, chat, name=None, file_hash=None, replace=True):
+        """
+        :type chat: Chat
+        :param name: name to store the chat under, defaults to the name of the chat
+        :type name: None or str
+        :param file_hash: hash of the chat file, so add_file can skip files that didn't change
+        :type file_hash: None or str
+        :param replace: replace a stored chat with the same name instead of raising an error
+        :type replace: bool
+        :return: id of the stored chat
+        :rtype: int
+        """
+        name = chat.name if name is None else name
+        if not name:
+            raise ValueError("Chats in a store need a name")
+        columns = chat.columns
+        with self.connection:
+            if name in self.get_chat_names():
+                if not replace:
+                    raise ValueError(f"Chat {name} is already stored")
+                self._remove_chat(name)
+            chat_id = self.connection.execute("INSERT INTO chats (name, hash) VALUES (?, ?)",
+                                              (name, file_hash)).lastrowid
+            author_ids = self._get_author_ids(columns.authors)
+            codes = _np.array(list(author_ids[author] for author in columns.authors), dtype=_np.int64)
+            rows = zip(columns.timestamps.tolist(), codes[columns.author_codes].tolist(), columns.contents(),
+                       columns.media.tolist())
+            self.connection.executemany(f"INSERT INTO messages (chat, timestamp, author, content, media) "
+                                        f"VALUES ({chat_id}, ?, ?, ?, ?)", rows)
+            if self.full_text:
+                self.connection.execute("INSERT INTO messages_fts (rowid, content) "
+                                        "SELECT id, content FROM messages WHERE chat = ?", (chat_id,))
+        return chat_id
+
+    def add_file(self, filename, name=None):
+        """Parse a chat file located in the folder specified in constants and store it, unless the same file is
+        already stored under the same name
+
+        :type filename: str
+        :param name: name to store the chat under, defaults to the filename
+        :type name: None or str
+        :return: whether the chat was parsed and stored
+        :rtype: bool
+        """
+        name = filename if name is None else name
+        file_hash = get_file_hash(f"{Directory.folder_chats}/{filename}")
+        stored = self.connection.execute("SELECT hash FROM chats WHERE name = ?", (name,)).fetchone()
+        if stored is not None and stored[0] == file_hash:
+            return False
+        self.add_chat(Chat.from_file(filename, name, columnar=True), name, file_hash)
+        return True
+
+    def remove_chat(self, name):
+        """
+        :type name: str
+        """
+        with self.connection:
+            self._remove_chat(name)
+
+    def _remove_chat(self, name):
+        chat_id = self.connection.execute("SELECT id FROM chats WHERE name = ?", (name,)).fetchone()
+        if chat_id is None:
+            return
+        if self.full_text:
+            # The full-text index needs the removed contents to find its entries
+            self.connection.execute("INSERT INTO messages_fts (messages_fts, rowid, content) "
+                                    "SELECT 'delete', id, content FROM messages WHERE chat = ?", chat_id)
+        self.connection.execute("DELETE FROM messages WHERE chat = ?", chat_id)
+        self.connection.execute("DELETE FROM chats WHERE id = ?", chat_id)
+
+    @staticmethod
+    def _where(chat_filter=None, author_filter=None, date_filter=None, time_filter=None, length_filter=None):
+        """Condition on the messages table selecting the messages the filters keep
+
+        :type chat_filter: None or str or list
+        :type author_filter: None or str or list
+        :type date_filter: None or (datetime.datetime, datetime.datetime)
+        :type time_filter: None or (datetime.time, datetime.time)
+        :type length_filter: None or (int, int)
+        :return: condition and its parameters
+        :rtype: (str, list)
+        """
+        conditions = ["1"]
+        parameters = list()
+        if chat_filter is not None:
+            chat_filter = [chat_filter] if type(chat_filter) is str else list(chat_filter)
+            conditions.append(f"messages.chat IN (SELECT id FROM chats WHERE name IN "
+                              f"({', '.join('?' * len(chat_filter))}))")
+            parameters += chat_filter
+        if author_filter is not None:
+            author_filter = [author_filter] if type(author_filter) is str else list(author_filter)
+            conditions.append(f"messages.author IN (SELECT id FROM authors WHERE name IN "
+                              f"({', '.join('?' * len(author_filter))}))")
+            parameters += author_filter
+        if date_filter is not None:
+            conditions.append("messages.timestamp BETWEEN ? AND ?")
+            parameters += list(to_timestamp(date) for date in date_filter)
+        if time_filter is not None:
+            conditions.append("messages.timestamp % 86400 BETWEEN ? AND ?")
+            parameters += list(time.hour * 3600 + time.minute * 60 + time.second for time in time_filter)
+        if length_filter is not None:
+            conditions.append("length(messages.content) BETWEEN ? AND ?")
+            parameters += list(length_filter)
+        return " AND ".join(conditions), parameters
+
+    @_profiling.profile(Stage.aggregate)
+    def count(self, data_type, by_chat=False, column="Messages", **filters):
+        """Count the messages per minute, hour, weekday, month, date, year or author with one grouped query
+
+        :param data_type: one of Result.all
+        :type data_type: str
+        :param by_chat: one column per chat, like ChatData.from_command_chats, instead of one column for all chats
+        :type by_chat: bool
+        :param column: name of the column when not counting by chat
+        :type column: str
+        :param filters: chat_filter, author_filter, date_filter, time_filter and length_filter
+        :return: same index as ChatData.from_command_chat gives for the selected messages
+        :rtype: pd.DataFrame
+        """
+        where, parameters = self._where(**filters)
+        match data_type:
+            case Result.minute:
+                key = "messages.timestamp % 86400 / 60"
+            case Result.hour:
+                key = "messages.timestamp % 86400 / 3600"
+            case Result.author:
+                key = "authors.name"
+            case _:
+                # Everything based on the date is grouped per day first and bucketed afterwards
+                key = "messages.timestamp / 86400"
+        query = (f"SELECT chats.name, {key}, COUNT(*) FROM messages "
+                 f"JOIN chats ON chats.id = messages.chat JOIN authors ON authors.id = messages.author "
+                 f"WHERE {where} GROUP BY messages.chat, {key}")
+        rows = self.connection.execute(query, parameters).fetchall()
+        chats = sorted(set(row[0] for row in rows)) if by_chat else [column]
+        if not rows:
+            return _pd.DataFrame(columns=chats, dtype=_np.int64)
+
+        names, keys, counts = zip(*rows)
+        columns = _np.array(list(map({chat: i for i, chat in enumerate(chats)}.get, names)) if by_chat
+                            else _np.zeros(len(rows), dtype=_np.int64))
+        counts = _np.array(counts, dtype=_np.int64)
+        match data_type:
+            case Result.minute:
+                index, keys = range(24 * 60), _np.array(keys, dtype=_np.int64)
+            case Result.hour:
+                index, keys = range(24), _np.array(keys, dtype=_np.int64)
+            case Result.author:
+                index = sorted(set(keys))
+                keys = _np.array(list(map({author: i for i, author in enumerate(index)}.get, keys)), dtype=_np.int64)
+            case _:
+                index, keys = get_day_buckets(_np.array(keys, dtype=_np.int64), data_type)
+        # Like ChatData, messages outside the index are ignored
+        inside = (keys >= 0) & (keys < len(index))
+        data = _np.zeros((len(index), len(chats)), dtype=_np.int64)
+        _np.add.at(data, (keys[inside], columns[inside]), counts[inside])
+        return _pd.DataFrame(index=index, columns=chats, data=data)
+
+    def _search_rows(self, pattern, words, regex, where, parameters):
+        """
+        :return: condition and parameters of the rows to count a search in, narrowed down with the full-text index
+            when it can be used
+        :rtype: (str, list)
+        """
+        if self.full_text and words and not regex:
+            # The full-text index matches whole words case-insensitively, so every message get_words finds the word
+            # in is matched, the exact count is only taken of those messages
+            return (f"messages.id IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?) AND {where}",
+                    [f'"{pattern}"'] + parameters)
+        return where, parameters
+
+    @_profiling.profile(Stage.aggregate)
+    def search(self, pattern, match_case=False, words=False, regex=False, **filters):
+        """
+        :type pattern: str
+        :param match_case: match upper and lowercase
+        :type match_case: bool
+        :param words: only search for actual words
+        :type words: bool
+        :param regex: use regular expression
+        :type regex: bool
+        :param filters: chat_filter, author_filter, date_filter, time_filter and length_filter
+        :return: number of occurrences of search, the same as ChatData.search on the selected messages
+        :rtype: int
+        """
+        if not match_case:
+            pattern = pattern.lower()
+        if words and not regex and not pattern.isalpha():
+            # get_words only gives words made of letters
+            return 0
+        where, parameters = self._search_rows(pattern, words, regex, *self._where(**filters))
+        query = f"SELECT SUM(search_count(content, ?, ?, ?, ?)) FROM messages WHERE {where}"
+        total = self.connection.execute(query, [pattern, match_case, words, regex] + parameters).fetchone()[0]
+        return total or 0
+
+    @_profiling.profile(Stage.aggregate)
+    def word_timeline(self, word, **filters):
+        """
+        :type word: str
+        :param filters: chat_filter, author_filter, date_filter, time_filter and length_filter
+        :return: frequency of the word per date of the selected messages, like ChatData.word_timeline
+        :rtype: pd.DataFrame
+        """
+        word = word.lower()
+        where, parameters = self._where(**filters)
+        first, last = self.connection.execute(f"SELECT MIN(timestamp) / 86400, MAX(timestamp) / 86400 FROM messages "
+                                              f"WHERE {where}", parameters).fetchone()
+        if first is None:
+            return _pd.DataFrame(columns=["Frequency"], dtype=_np.int64)
+        epoch = _datetime.date(1970, 1, 1)
+        dates = get_date_range(epoch + _datetime.timedelta(days=first), epoch + _datetime.timedelta(days=last))
+        frequencies = _np.zeros(len(dates), dtype=_np.int64)
+        if word.isalpha():
+            where, parameters = self._search_rows(word, True, False, where, parameters)
+            query = (f"SELECT timestamp / 86400, SUM(search_count(content, ?, 0, 1, 0)) FROM messages "
+                     f"WHERE {where} GROUP BY timestamp / 86400")
+            for day, frequency in self.connection.execute(query, [word] + parameters):
+                frequencies[day - first] = frequency
+        return _pd.DataFrame(index=dates, columns=["Frequency"], data=frequencies)
+
+    @_profiling.profile(Stage.filter)
+    def from_filter(self, chat_filter=None, author_filter=None, date_filter=None, time_filter=None,
+                    length_filter=None, name=""):
+        """Load the selected messages as a chat, like Chat.from_filter but only reading the selected messages
+
+        :type chat_filter: None or str or list
+        :type author_filter: None or str or list
+        :param date_filter: minimum and maximum date to filter
+        :type date_filter: None or (datetime.datetime, datetime.datetime)
+        :param time_filter: minimum and maximum time to filter
+        :type time_filter: None or (datetime.time, datetime.time)
+        :param length_filter: minimum and maximum message length to filter
+        :type length_filter: None or (int, int)
+        :param name: name of the chat, defaults to the name of the only selected chat
+        :type name: str
+        :return: chat stored as columns, messages sent at the same time keep the order they were stored in
+        :rtype: Chat
+        :raises ValueError: when no message matches the filters
+        """
+        where, parameters = self._where(chat_filter, author_filter, date_filter, time_filter, length_filter)
+        if not name and type(chat_filter) is str:
+            name = chat_filter
+        query = (f"SELECT messages.timestamp, messages.author, messages.content, messages.media FROM messages "
+                 f"WHERE {where} ORDER BY messages.timestamp, messages.id")
+        rows = self.connection.execute(query, parameters).fetchall()
+        if not rows:
+            # A chat needs a first and last message for its dates
+            raise ValueError("No stored messages match the filters")
+        timestamps, author_ids, contents, media = zip(*rows)
+
+        author_ids = _np.array(author_ids, dtype=_np.int64)
+        present = _np.unique(author_ids).tolist()
+        query = f"SELECT id, name FROM authors WHERE id IN ({', '.join('?' * len(present))})"
+        names = dict(self.connection.execute(query, present))
+        authors = sorted(names.values())
+        lookup = _np.zeros(max(present) + 1, dtype=_np.int32)
+        for code, author_id in enumerate(sorted(present, key=names.get)):
+            lookup[author_id] = code
+
+        contents = list(content.encode("utf-8") for content in contents)
+        offsets = _np.zeros(len(contents) + 1, dtype=_np.int64)
+        _np.cumsum(list(map(len, contents)), out=offsets[1:])
+        columns = MessageColumns(_np.array(timestamps, dtype=_np.int64), lookup[author_ids], authors,
+                                 b"".join(contents), offsets, _np.array(media, dtype=bool))
+        return Chat.from_message_array(columns, name)
+
+
+if __name__ == '__main__':
+    from menu import get_chat_filenames
+
+    with ChatStore() as store:
+        for filename in get_chat_filenames():
+            store.add_file(filename)
+        print(store.count(Result.author, by_chat=True))
@@ -1,13 +1,21 @@
-import wordcloud
+# Matplotlib, wordcloud and pandas are imported when a figure is made, so importing this module stays fast
 import numpy as np
-from matplotlib import pyplot as plt
-from matplotlib.backends import backend_pdf
-from matplotlib import dates as mdates
 from math import pi, floor
-import pandas as pd
 
+from constants import Stage, max_plot_points
+from profiling import count_items, profile
 
+
+def show():
+    """Show all created figures"""
+    from matplotlib import pyplot as plt
+    plt.show()
+
+
+@profile(Stage.render, count_items)
 def radar_chart(categories, datasets, names, ticks_amount=4, r_min=None, r_max=None, title=None):
+    from matplotlib import pyplot as plt
+
     fig, ax = plt.subplots(subplot_kw={'projection': 'polar'})
     if title is not None:
         ax.set_title(title)
@@ -25,7 +33,8 @@ def radar_chart(categories, datasets, names, ticks_amount=4, r_min=None, r_max=N
     angles = np.linspace(0, 2 * pi, len(categories) + 1)
 
     ax.set_xticks(angles[:-1], categories)
-    ax.set_rticks(r_ticks[:-1], color="grey", size=7)
+    ax.set_rticks(r_ticks[:-1])
+    ax.tick_params(axis="y", colors="grey", labelsize=7)
     ax.set_rlim(r_ticks[0], r_ticks[-1])
 
     for dataset, name in zip(datasets, names):
@@ -36,6 +45,7 @@ def radar_chart(categories, datasets, names, ticks_amount=4, r_min=None, r_max=N
     return fig, ax
 
 
+@profile(Stage.render, count_items)
 def save_figs(data_sets):
     """
 
@@ -44,6 +54,9 @@ def save_figs(data_sets):
     :return:
     :rtype:
     """
+    from matplotlib import pyplot as plt
+    from matplotlib.backends import backend_pdf
+
     with backend_pdf.PdfPages("output.pdf") as pdf:
         for data_set in data_sets:
             figure = plt.figure()
@@ -52,7 +65,82 @@ def save_figs(data_sets):
         pdf.savefig()
 
 
-def get_figure_1(dataframe, title=None, x_label=None, y_label=None, show_legend=None, show_grid=True,):
+def lttb(values, points):
+    """Largest-triangle-three-buckets, pick the points that keep the shape of a line with far fewer points
+
+    :param values: y values of a line at equally spaced x values
+    :type values: np.ndarray
+    :param points: amount of points to keep, at least 3
+    :type points: int
+    :return: positions of the kept points, ascending and always including the first and last point
+    :rtype: np.ndarray
+    """
+    length = len(values)
+    if points >= length or points < 3:
+        return np.arange(length)
+    values = np.asarray(values, dtype=float)
+    # Every point between the first and last one is in one of points - 2 buckets
+    edges = np.linspace(1, length - 1, points - 1).astype(np.int64)
+    edges = np.append(edges, length)
+    selected = np.zeros(points, dtype=np.int64)
+    selected[-1] = length - 1
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_x = (edges[i + 1] + edges[i + 2] - 1) / 2
+        next_y = values[edges[i + 1]:edges[i + 2]].mean()
+        previous = selected[i]
+        x = np.arange(start, end)
+        areas = np.abs((previous - next_x) * (values[start:end] - values[previous]) -
+                       (previous - x) * (next_y - values[previous]))
+        selected[i + 1] = start + np.argmax(areas)
+    return selected
+
+
+def downsample(dataframe, max_points=max_plot_points, method="lttb"):
+    """Limit the amount of rows of a line figure, so rendering and saving take the same time for any date range
+
+    :param dataframe: lines to plot, one per column
+    :type dataframe: pd.DataFrame
+    :param max_points: maximum amount of rows, None keeps all rows
+    :type max_points: None or int
+    :param method: lttb keeps the rows that shape the lines most, mean and sum aggregate equal periods of rows
+    :type method: str
+    :rtype: pd.DataFrame
+    """
+    length = len(dataframe.index)
+    if max_points is None or length <= max_points:
+        return dataframe
+    match method:
+        case "lttb":
+            points = max(3, max_points // max(1, len(dataframe.columns)))
+            rows = np.unique(np.concatenate(list(lttb(dataframe[column].to_numpy(), points)
+                                                 for column in dataframe.columns)))
+            return dataframe.iloc[rows]
+        case "mean" | "sum":
+            import pandas as pd
+
+            starts = np.arange(0, length, -(-length // max_points))
+            data = np.add.reduceat(dataframe.to_numpy(dtype=float), starts, axis=0)
+            if method == "mean":
+                data /= np.diff(np.append(starts, length))[:, np.newaxis]
+            return pd.DataFrame(index=dataframe.index[starts], columns=dataframe.columns, data=data)
+    raise ValueError(f"Unknown downsampling method {method}")
+
+
+@profile(Stage.render, count_items)
+def get_figure_1(dataframe, title=None, x_label=None, y_label=None, show_legend=None, show_grid=True,
+                 max_points=max_plot_points, downsample_method="lttb"):
+    """
+    :param dataframe: lines to plot, one per column
+    :type dataframe: pd.DataFrame
+    :param max_points: maximum amount of points per figure, None plots every row
+    :type max_points: None or int
+    :param downsample_method: lttb, mean or sum, see downsample
+    :type downsample_method: str
+    :rtype: (plt.Figure, plt.Axes)
+    """
+    from matplotlib import pyplot as plt
+
     show_legend = len(dataframe.columns.values) > 1 if show_legend is None else show_legend
 
     fig, ax = plt.subplots(figsize=(8.3, 5.8))
@@ -67,13 +155,15 @@ def get_figure_1(dataframe, title=None, x_label=None, y_label=None, show_legend=
     ticks_amount = min(10, len(dataframe.index.values))
     ticks_spacing = floor((len(dataframe.index.values) - 1) / (ticks_amount - 1))
     x_ticks = list(dataframe.index.values[ticks_spacing * i] for i in range(ticks_amount))
+    x_limits = dataframe.index.values[0], dataframe.index.values[-1]
+    dataframe = downsample(dataframe, max_points, downsample_method)
 
     for column in dataframe.columns.values:
         ax.plot(dataframe[column], label=column, zorder=3)
         ax.fill_between(dataframe.index.values, dataframe[column], alpha=0.7, zorder=3)
 
     ax.set_xticks(x_ticks)
-    ax.set_xlim(dataframe.index.values[0], dataframe.index.values[-1])
+    ax.set_xlim(*x_limits)
     ax.set_ylim(bottom=0)
 
     if show_legend:
@@ -82,19 +172,37 @@ def get_figure_1(dataframe, title=None, x_label=None, y_label=None, show_legend=
     return fig, ax
 
 
-def get_figure_date(dataframe):
-    fig, ax = get_figure_1(dataframe, "Messages per date", y_label="Messages", show_grid=True)
+@profile(Stage.render, count_items)
+def get_figure_date(dataframe, max_points=max_plot_points, downsample_method="lttb"):
+    """
+    :param dataframe: messages per date, one column per line
+    :type dataframe: pd.DataFrame
+    :param max_points: maximum amount of points per figure, None plots every date
+    :type max_points: None or int
+    :param downsample_method: lttb, mean or sum, see downsample
+    :type downsample_method: str
+    :rtype: (plt.Figure, plt.Axes)
+    """
+    from matplotlib import dates as mdates
+
+    fig, ax = get_figure_1(dataframe, "Messages per date", y_label="Messages", show_grid=True,
+                           max_points=max_points, downsample_method=downsample_method)
     fig.autofmt_xdate()
     ax.xaxis.set_major_formatter(mdates.DateFormatter("%d-%m-%Y"))
     return fig, ax
 
 
+@profile(Stage.render, count_items)
 def get_figure_days(dataframe):
     datasets = list(dataframe[column].tolist() for column in dataframe.columns.values)
     return radar_chart(dataframe.index.values, datasets, dataframe.columns.values, r_min=0,
                        title="Messages per weekday")
 
 
-def word_cloud(frequencies):
-    cloud = wordcloud.WordCloud(width=1920, height=1080, min_font_size=20, background_color="white")
+@profile(Stage.render, count_items)
+def word_cloud(frequencies, random_state=None):
+    import wordcloud
+
+    cloud = wordcloud.WordCloud(width=1920, height=1080, min_font_size=20, background_color="white",
+                                random_state=random_state)
     return cloud.generate_from_frequencies(frequencies)
@@ -0,0 +1,87 @@
+import numpy as _np
+
+
+class WordIndex:
+    def __init__(self, words, starts, positions, counts):
+        """Inverted index with the positions of the messages every word occurs in, built once per chat
+
+        The postings of all words are stored one after another, the postings of the word with code i are found from
+        starts[i] up to starts[i + 1].
+
+        :param words: code of every word, words are lowercase like Message.get_words returns them
+        :type words: dict of str to int
+        :param starts: start of the postings of every word code, followed by the total amount of postings
+        :type starts: np.ndarray
+        :param positions: position in the chat of every message a word occurs in, ascending per word
+        :type positions: np.ndarray
+        :param counts: how often the word occurs in the message at the same place in positions
+        :type counts: np.ndarray
+        """
+        self.words = words
+        self.starts = starts
+        self.positions = positions
+        self.counts = counts
+
+        self.totals = _np.add.reduceat(counts, starts[:-1]) if len(counts) > 0 else _np.zeros(0, dtype=_np.int64)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.words
+
+    def postings(self, word):
+        """
+        :type word: str
+        :return: positions of the messages containing the word and how often it occurs in each of them
+        :rtype: (np.ndarray, np.ndarray)
+        """
+        code = self.words.get(word)
+        if code is None:
+            return _np.zeros(0, dtype=_np.int64), _np.zeros(0, dtype=_np.int64)
+        start, end = self.starts[code], self.starts[code + 1]
+        return self.positions[start:end], self.counts[start:end]
+
+    def count(self, word):
+        """
+        :type word: str
+        :return: total amount of occurrences of the word
+        :rtype: int
+        """
+        code = self.words.get(word)
+        return 0 if code is None else int(self.totals[code])
+
+    def frequencies(self):
+        """
+        :return: total amount of occurrences of every word
+        :rtype: dict of str to int
+        """
+        return dict(zip(self.words, self.totals.tolist()))
+
+    @staticmethod
+    def from_messages(messages):
+        """
+        :type messages: Chat or list of Message
+        :rtype: WordIndex
+        """
+        words = dict()
+        codes = list()
+        positions = list()
+        counts = list()
+        for position, message in enumerate(messages):
+            word_counts = dict()
+            for word in message.get_words():
+                word_counts[word] = word_counts.get(word, 0) + 1
+            for word, count in word_counts.items():
+                codes.append(words.setdefault(word, len(words)))
+                positions.append(position)
+                counts.append(count)
+
+        codes = _np.array(codes, dtype=_np.int64)
+        order = _np.argsort(codes, kind="stable")
+        starts = _np.zeros(len(words) + 1, dtype=_np.int64)
+        _np.cumsum(_np.bincount(codes, minlength=len(words)), out=starts[1:])
+        return WordIndex(words,
+                         starts,
+                         _np.array(positions, dtype=_np.int64)[order],
+                         _np.array(counts, dtype=_np.int64)[order])